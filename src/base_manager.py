@@ -15,6 +15,9 @@ class BaseManager(ABC):
     async def on_step(self, bot: sc2.BotAI, iteration):
         pass
 
+    async def on_start(self, bot: sc2.BotAI):
+        pass
+
     async def on_building_construction_complete(self, bot: sc2.BotAI, unit):
         pass
 
@@ -13,16 +13,27 @@ from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
 from sc2.dicts.upgrade_researched_from import UPGRADE_RESEARCHED_FROM
 from sc2.dicts.unit_research_abilities import RESEARCH_INFO
 
+from tech_tree import get_tech_tree
+from logger import get_logger
+from race_rules import CONSUMED, TRAVEL, TRAVEL_MINERALS, LARVA_TICKS, MAX_LARVA_PER_TOWNHALL
+
 MINERALS_PER_TICK = 36.444 / (60*16) 
 VESPENE_PER_TICK = 38.000 / (60*16)
 
+logger = get_logger("build")
+
+# simulating exactly when_larva_ready ticks can leave larva_progress just below 1
+LARVA_EPSILON = 1e-6
+
 class BusyUnit:
     """
     Units that are building or are being built are a 'BusyUnit'
+    is_new is False for producers that become idle again, they give no supply or workers when done
     """
-    def __init__(self, unit_id, ticks_left):
+    def __init__(self, unit_id, ticks_left, is_new=True):
         self.unit_id: UnitTypeId = unit_id
         self.ticks_left: int = ticks_left
+        self.is_new: bool = is_new
 
     def __lt__(self, other):
         return self.ticks_left < other.ticks_left
@@ -47,7 +58,7 @@ class BuildorderState:
         """
         parameter units: number of each specific unit we have
         parameter busy_units: list of (id, time) for units that are not idle (under construction
-                               or constructing)
+                               or constructing), (id, time, False) for producers that are constructing
         parameter plan: initial plan, but most often empty
         parameter bot: reference to sc2.BotAI so we can access UnitTypeId tables and what not
         """
@@ -58,12 +69,17 @@ class BuildorderState:
         self.supply: int = supply
         self.supply_cap: int = supply_cap
         self.units = units
-        self.busy_units: List[BusyUnit] = [BusyUnit(unit_id, time) for unit_id, time in busy_units]
+        self.busy_units: List[BusyUnit] = [BusyUnit(*busy_unit) for busy_unit in busy_units]
         self.plan: List[UnitTypeId] = plan
         self.bot: BotAI = bot        
 
         self.heuristic = 0
         self.ticks = 0
+        # part of the next larva that the townhalls have spawned, only used by zerg
+        self.larva_progress = 0.0
+        # the order that was expanded into this state if it started without waiting, None otherwise
+        # and for macro-actions, see the partial-order reduction in ManagerBuild.calculate_buildorder
+        self.last_order: UnitTypeId = None
 
 
     def __str__(self):
@@ -71,7 +87,7 @@ class BuildorderState:
         Prints the basic information:
         ticks, resources, workers, supply and plan
         """
-        s = "ticks: {}, heuristic: {}, (m, w_m): ({}, {}), (v, w_v): ({}, {}), ".format(self.ticks, self.minerals, self.heuristic, self.w_minerals, self.vespene, self.w_vespene)
+        s = "ticks: {}, heuristic: {}, (m, w_m): ({}, {}), (v, w_v): ({}, {}), ".format(self.ticks, self.heuristic, self.minerals, self.w_minerals, self.vespene, self.w_vespene)
         s += "(s, s_c): ({}, {}), ticks: {}, plan: {}, ".format(self.supply,
                 self.supply_cap, self.ticks, self.plan)
         s += "busy_units: {}, units: {}".format(self.busy_units, self.units)
@@ -136,6 +152,18 @@ class BuildorderState:
         return min_time if min_time != START_TIME else -1
     
 
+    def when_supply_ready(self, supply: Dict[UnitTypeId, int]) -> int:
+        """
+        Returns the number of ticks until a supply provider that is being built is done
+        -1 if none is being built
+        """
+        min_time = -1
+        for busy_unit in self.busy_units:
+            if busy_unit.is_new and busy_unit.unit_id in supply:
+                if min_time < 0 or busy_unit.ticks_left < min_time:
+                    min_time = busy_unit.ticks_left
+        return min_time
+
     def when(self, unit: UnitTypeId) -> int:
         """
         Returns the number of ticks it takes until we can build this unit
@@ -143,10 +171,9 @@ class BuildorderState:
         -1 if impossible
         """
         max_time = 0
-        cost = self.bot.calculate_cost(unit)
-        cost_minerals = cost.minerals
-        cost_vespene = cost.vespene
-        cost_supply = self.bot.calculate_supply_cost(unit)
+        tech_tree = get_tech_tree(self.bot)
+        cost_minerals, cost_vespene, _ = tech_tree.cost[unit]
+        cost_supply = tech_tree.supply_cost[unit]
 
         if self.minerals - cost_minerals < 0:
             if self.w_minerals <= 0:
@@ -166,45 +193,30 @@ class BuildorderState:
             if self.supply_cap > 200: # we cannot build more supply
                 #print("Building unit {} failed due to no supply space (>=200)".format(unit))
                 return -1
-            time = self.when_unit_ready(PYLON, only_busy=True) # we require a new pylon
+            time = self.when_supply_ready(tech_tree.rules.supply) # we require a new supply provider
             if time < 0:
-                #print("Building unit {} failed due to not having no pylons on the way".format(unit))
+                #print("Building unit {} failed due to not having no supply providers on the way".format(unit))
                 return -1
             max_time = max(max_time, time)
 
         # check that we can fullfill all tech requirements
-        req = unit
-        if unit == GATEWAY or unit == WARPGATE: # TODO perhaps handle this requirement differently
-            time = self.when_unit_ready(PYLON)
+        for req in tech_tree.requirements[unit]:
+            time = self.when_unit_ready(req)
             if time < 0:
+                #print("Building unit {} failed due to not having tech-req {}".format(unit, req))
                 return -1
             max_time = max(max_time, time)
-
-        while req in PROTOSS_TECH_REQUIREMENT:
-            time = self.when_unit_ready(PROTOSS_TECH_REQUIREMENT[req])
-            if time < 0:
-                #print("Building unit {} failed due to not having tech-req {}".format(unit, PROTOSS_TECH_REQUIREMENT[req]))
-                return -1
-            max_time = max(max_time, time)
-            req = PROTOSS_TECH_REQUIREMENT[req]
     
-        creators = list(UNIT_TRAINED_FROM[unit])
+        creators = tech_tree.producers[unit]
         MAX_TIME = 10000
         min_time_creator = MAX_TIME 
         
         # For e.g. gateway units, they can also be constructed from warpgates
         # Here we check for if any creator exists
         for creator in creators:
-            # handle the probe case seperately
-            time = 10000
-            if creator == PROBE:
-                if PROBE in self.units and self.units[PROBE] > 0:
-                    min_time_creator = 0
-                    break
-                # we have no PROBE but perhaps we are building one?
-                time = self.when_unit_ready(PROBE)
-            else:
-                time = self.when_unit_ready(creator)
+            time = self.when_unit_ready(creator)
+            if time < 0 and creator == tech_tree.rules.larva:
+                time = self.when_larva_ready(tech_tree.rules)
                 
             if time < 0: # this particular creator does not exists
                 continue
@@ -221,9 +233,11 @@ class BuildorderState:
         """
         Simulates the current BuildorderState 'ticks' forward.
         Adds resources
-        Handles busy_units: updates supply if pylon is built, workers working if probe is
-        finished, and of course the number of units if something is finished
+        Handles busy_units: updates supply if a supply provider is built, workers working
+        if a worker or gas building is finished, and of course the number of units if
+        something is finished. Townhalls spawn larva if the race has them
         """
+        rules = get_tech_tree(bot).rules
         self.ticks += ticks
 
         # update resources
@@ -231,70 +245,99 @@ class BuildorderState:
         self.vespene += self.w_vespene * VESPENE_PER_TICK * ticks
 
         new_busy = []
-        for i in range(len(self.busy_units)):
-            busy_unit = self.busy_units[i].unit_id
-            ticks_left = self.busy_units[i].ticks_left
+        for busy in self.busy_units:
+            busy_unit = busy.unit_id
+            ticks_left = busy.ticks_left
             tick_diff = ticks - ticks_left
 
             if ticks_left - ticks <= 0:
                 #print(" Unit finished: {}".format(busy_unit))
-                if not busy_unit in self.units:
-                    #print(" busy_unit not in self.units")
-                    self.units[busy_unit] = 1
-                else:
-                    self.units[busy_unit] += 1
-
-                if busy_unit == PROBE: # we add new probes to minerals
-                    self.w_minerals += 1 # TODO fix max mineral utilization 
-                    self.minerals += tick_diff * MINERALS_PER_TICK
+                self.units[busy_unit] = self.units.get(busy_unit, 0) + 1
+                if not busy.is_new:
+                    continue
 
-                elif busy_unit == ASSIMILATOR: # we always utilize assimilators fully
-                    self.w_minerals = min(0, self.w_minerals-3)
-                    self.w_vespene += 3
-                    self.minerals -= 3 * tick_diff * MINERALS_PER_TICK
-                    self.vespene += 3* tick_diff * VESPENE_PER_TICK
+                # new workers mine minerals, gas buildings are always filled from the mineral workers
+                new_workers, to_gas = rules.workers_on_complete.get(busy_unit, (0, 0))
+                if new_workers or to_gas:
+                    to_gas = min(to_gas, self.w_minerals + new_workers)
+                    self.w_minerals += new_workers - to_gas
+                    self.w_vespene += to_gas
+                    self.minerals += (new_workers - to_gas) * tick_diff * MINERALS_PER_TICK
+                    self.vespene += to_gas * tick_diff * VESPENE_PER_TICK
 
-                elif busy_unit == PYLON:
-                    self.supply_cap = min(200, self.supply_cap + 8) 
-
-                else:
-                    pass
+                self.supply_cap = min(200, self.supply_cap + rules.supply.get(busy_unit, 0))
 
             else: # the unit is still busy
                 #print(" Adding new unit to new_busy")
-                new_busy.append(BusyUnit(busy_unit, ticks_left - ticks))
+                new_busy.append(BusyUnit(busy_unit, ticks_left - ticks, busy.is_new))
 
         # update the busy_units
         self.busy_units = new_busy
 
+        # townhalls spawn larva until each has MAX_LARVA_PER_TOWNHALL
+        townhalls = self.get_larva_townhalls(rules)
+        if townhalls:
+            self.larva_progress += ticks * townhalls / LARVA_TICKS
+            spawned = int(self.larva_progress + LARVA_EPSILON)
+            self.larva_progress = max(0.0, self.larva_progress - spawned)
+            larva = self.units.get(rules.larva, 0)
+            self.units[rules.larva] = max(larva, min(larva + spawned, MAX_LARVA_PER_TOWNHALL * townhalls))
+
+    def get_larva_townhalls(self, rules) -> int:
+        """
+        Returns the number of townhalls that spawn larva, busy townhalls (e.g. training a queen
+        or morphing) spawn larva too, townhalls that are being built do not
+        """
+        townhalls = sum(self.units.get(townhall, 0) for townhall in rules.larva_producers)
+        for busy_unit in self.busy_units:
+            if not busy_unit.is_new and busy_unit.unit_id in rules.larva_producers:
+                townhalls += 1
+        return townhalls
+
+    def when_larva_ready(self, rules) -> int:
+        """
+        Returns the number of ticks until the townhalls spawn the next larva, -1 if they can not
+        """
+        townhalls = self.get_larva_townhalls(rules)
+        if not townhalls:
+            return -1
+        return (1 - self.larva_progress) * LARVA_TICKS / townhalls
 
-    def build(self, unit: UnitTypeId, bot):
+    def build(self, unit: UnitTypeId, bot) -> bool:
         """
         Updates the state of self when building 'unit'
         Removes resources and adds to busy_units
-        Note: assumes that the unit can be built
+        The producer is taken according to the rules of the race, see race_rules.py
+        Note: assumes that the unit can be built, see when()
+        Returns False and leaves self unchanged if no producer is idle
         """
-        cost = bot.calculate_cost(unit)
-        cost_minerals = cost.minerals
-        cost_vespene = cost.vespene
-        build_time = cost.time
-        supply_cost = bot.calculate_supply_cost(unit)
+        tech_tree = get_tech_tree(bot)
+        rules = tech_tree.rules
+        creator = next((creator for creator in tech_tree.producers[unit] if self.units.get(creator, 0) > 0), None)
+        if creator is None:
+            logger.warning("No idle producer of %s at tick %s", unit, self.ticks)
+            return False
+
+        cost_minerals, cost_vespene, build_time = tech_tree.cost[unit]
+        supply_cost = tech_tree.supply_cost[unit]
 
         self.minerals -= cost_minerals
         self.vespene -= cost_vespene
         self.supply += supply_cost
 
-        creators = list(UNIT_TRAINED_FROM[unit])
-        for creator in creators:
-            if creator == PROBE: # the probe needs to move away and build the structure
-                self.minerals -= 10
-
-            elif creator in self.units:
-                self.units[creator] -= 1
-                new_busy_creator = BusyUnit(creator, build_time)
-                self.busy_units.append(new_busy_creator)
-                break
+        mode = rules.producer_mode.get(creator)
+        if mode == TRAVEL: # the worker needs to move away and build the structure
+            self.minerals -= TRAVEL_MINERALS
+        else:
+            self.units[creator] -= 1
+            self.w_minerals -= rules.producer_mining.get(creator, 0)
+            if mode == CONSUMED:
+                self.supply -= tech_tree.supply_cost.get(creator, 0)
+            else:
+                # workers are new when they are done as they go back to mining
+                self.busy_units.append(BusyUnit(creator, build_time, creator == rules.worker))
         
         new_busy_unit = BusyUnit(unit, build_time)
         self.busy_units.append(new_busy_unit)
         self.plan.append(unit)
+        return True
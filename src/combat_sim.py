@@ -0,0 +1,134 @@
+import numpy as np
+
+import sc2
+from sc2.constants import *
+from sc2.unit import Unit
+
+from typing import List, Tuple, Dict
+
+"""
+Lanchester combat estimator
+
+Each side of an engagement is reduced to four numbers: total hp (health plus
+shields), total dps, and the hp weighted mean of range and movement speed.
+The fight is then solved in closed form, so many candidate engagements are
+scored at once with numpy:
+
+1. the side with the longer range shoots for free while the other closes the gap
+2. both sides fight, the dps of a side shrinks with its hp (Lanchester's square law)
+
+Armor, upgrades, splash and micro are not modelled
+"""
+
+# columns of a side array
+HP = 0
+DPS = 1
+RANGE = 2
+SPEED = 3
+
+# the free shooting before the fight is capped, units do not chase forever
+MAX_OPENING = 5.0
+
+ENGAGE = "ENGAGE"
+WAIT = "WAIT"
+RETREAT = "RETREAT"
+
+def unit_stats(unit: Unit) -> Tuple[float, float, float, float]:
+    """
+    Returns (hp, dps, range, speed) of unit from the game data
+    """
+    hp = unit.health + unit.shield
+    dps = max(unit.ground_dps, unit.air_dps)
+    weapon_range = max(unit.ground_range, unit.air_range)
+    return hp, dps, weapon_range, unit.movement_speed
+
+def side_totals(stats: np.ndarray, groups: np.ndarray, amount: int) -> np.ndarray:
+    """
+    Sums the unit stats (one row per unit) into amount sides, groups holds
+    the side of every unit. Returns an (amount, 4) side array
+    """
+    sides = np.zeros((amount, 4), dtype=np.float64)
+    if len(stats) == 0:
+        return sides
+    hp = stats[:, HP]
+    np.add.at(sides[:, HP], groups, hp)
+    np.add.at(sides[:, DPS], groups, stats[:, DPS])
+    np.add.at(sides[:, RANGE], groups, stats[:, RANGE] * hp)
+    np.add.at(sides[:, SPEED], groups, stats[:, SPEED] * hp)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sides[:, RANGE] = np.where(sides[:, HP] > 0, sides[:, RANGE] / sides[:, HP], 0)
+        sides[:, SPEED] = np.where(sides[:, HP] > 0, sides[:, SPEED] / sides[:, HP], 0)
+    return sides
+
+def mask_totals(stats: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Like side_totals, but mask[i, j] tells if unit j takes part in engagement i,
+    a unit can be part of several engagements
+    """
+    sides = np.zeros((len(mask), 4), dtype=np.float64)
+    if len(stats) == 0:
+        return sides
+    weights = mask.astype(np.float64)
+    hp = weights @ stats[:, HP]
+    sides[:, HP] = hp
+    sides[:, DPS] = weights @ stats[:, DPS]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sides[:, RANGE] = np.where(hp > 0, (weights @ (stats[:, RANGE] * stats[:, HP])) / hp, 0)
+        sides[:, SPEED] = np.where(hp > 0, (weights @ (stats[:, SPEED] * stats[:, HP])) / hp, 0)
+    return sides
+
+def _opening(shooter: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    Hp the target has left after closing the range gap to shooter
+    """
+    gap = np.maximum(0, shooter[:, RANGE] - target[:, RANGE])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seconds = np.where(target[:, SPEED] > 0, gap / target[:, SPEED], MAX_OPENING)
+    seconds = np.minimum(seconds, MAX_OPENING)
+    return np.maximum(0, target[:, HP] - shooter[:, DPS] * seconds)
+
+def simulate(friendly: np.ndarray, enemy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predicts the outcome of every engagement, friendly and enemy are (N, 4) side arrays
+    Returns the fraction of hp that each side has left afterwards, the loser has 0
+    """
+    ha0 = friendly[:, HP]
+    hb0 = enemy[:, HP]
+
+    # free shots of the longer ranged side, the dps of the target shrinks with its hp
+    hb = _opening(friendly, enemy)
+    ha = _opening(enemy, friendly)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # dps per hp, constant during the fight under the square law
+        a = np.where(ha0 > 0, friendly[:, DPS] / ha0, 0)
+        b = np.where(hb0 > 0, enemy[:, DPS] / hb0, 0)
+
+        # a*ha^2 - b*hb^2 stays constant, the side where it ends positive wins
+        k = a * ha * ha - b * hb * hb
+        ha_end = np.where(k > 0, np.sqrt(np.where(a > 0, k / a, 0)), 0)
+        hb_end = np.where(k < 0, np.sqrt(np.where(b > 0, -k / b, 0)), 0)
+        # nobody can shoot, both sides keep what they had
+        stalemate = (a == 0) & (b == 0)
+        ha_end = np.where(stalemate, ha, ha_end)
+        hb_end = np.where(stalemate, hb, hb_end)
+
+        friendly_left = np.where(ha0 > 0, ha_end / ha0, 0)
+        enemy_left = np.where(hb0 > 0, hb_end / hb0, 0)
+    return friendly_left, enemy_left
+
+def decide(friendly_left: np.ndarray, enemy_left: np.ndarray, in_reach: np.ndarray,
+           margin: float = 0.2) -> List[str]:
+    """
+    ENGAGE if we are predicted to win with more than margin of our hp left,
+    RETREAT if we are predicted to lose and the enemy can reach us,
+    WAIT otherwise
+    """
+    decisions = []
+    for left, enemy, reach in zip(friendly_left, enemy_left, in_reach):
+        if left > margin:
+            decisions.append(ENGAGE)
+        elif enemy > 0 and reach:
+            decisions.append(RETREAT)
+        else:
+            decisions.append(WAIT)
+    return decisions
@@ -0,0 +1,61 @@
+import sc2
+from sc2.constants import *
+from sc2.ids.ability_id import AbilityId
+from sc2.unit import Unit
+from sc2.unit_command import UnitCommand
+from sc2.position import Point2
+
+from typing import List, Tuple, Dict, Union
+
+from logger import get_logger
+
+logger = get_logger("commands")
+
+class CommandGrouper:
+    """
+    Collects the unit commands of a step and issues them grouped by target
+
+    python-sc2 merges consecutive commands with the same ability, target and
+    queue flag into one raw action (combine_actions in Client.actions), so the
+    commands of a group are issued through bot.do one after the other and with
+    the same target object. Commands that a unit is already executing are
+    dropped by python-sc2 too (prevent_double_actions), so they are issued anyway
+    """
+    def __init__(self):
+        # (ability, target) -> commands with that target, positions are rounded to 0.1
+        self.groups: Dict[Tuple[AbilityId, Union[int, Tuple[float, float]]], List[UnitCommand]] = {}
+
+        # counts of the last flush and totals over the game
+        self.last_commands = 0
+        self.total_commands = 0
+        self.total_groups = 0
+
+    def command(self, unit: Unit, ability: AbilityId, target: Union[Unit, Point2]):
+        self.total_commands += 1
+        self.last_commands += 1
+        key = target.tag if isinstance(target, Unit) else (round(target.x, 1), round(target.y, 1))
+        group = self.groups.setdefault((ability, key), [])
+        # the first target of the group is used for all of them, so python-sc2 can merge them
+        group.append(unit(ability, group[0].target if group else target))
+
+    def attack(self, unit: Unit, target: Union[Unit, Point2]):
+        self.command(unit, AbilityId.ATTACK, target)
+
+    def move(self, unit: Unit, target: Union[Unit, Point2]):
+        self.command(unit, AbilityId.MOVE, target)
+
+    def flush(self, bot: sc2.BotAI) -> int:
+        """
+        Issues the collected commands through bot.do, group after group
+        Returns the number of groups, python-sc2 sends each as one raw action
+        """
+        for commands in self.groups.values():
+            for command in commands:
+                bot.do(command)
+        groups = len(self.groups)
+        self.total_groups += groups
+        logger.debug("%d unit commands issued in %d groups", self.last_commands, groups)
+
+        self.last_commands = 0
+        self.groups.clear()
+        return groups
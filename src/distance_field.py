@@ -0,0 +1,116 @@
+import heapq
+import math
+
+import numpy as np
+
+import sc2
+from sc2.constants import *
+from sc2.position import Point2
+
+from typing import List, Tuple, Dict
+
+SQRT2 = math.sqrt(2)
+
+class DistanceFields:
+    """
+    Ground distance fields over the pathing grid, one per key location
+
+    A field holds the ground distance from its source to every cell of the map,
+    so after it is computed the ground distance to any position is an array lookup.
+    Fields are computed in the warmup (see UBot.on_start) and cached by the rounded
+    source position. Sources without a field fall back to the straight line distance,
+    a field is never computed during a step
+    """
+    def __init__(self, bot: sc2.BotAI):
+        # indexed [y, x], True where ground units can walk
+        self.pathable: np.ndarray = bot.game_info.pathing_grid.data_numpy != 0
+        self.height, self.width = self.pathable.shape
+        self.fields: Dict[Tuple[int, int], np.ndarray] = {}
+
+        # the grid with a border of unpathable cells, flattened, so neighbours never leave it
+        padded = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = self.pathable
+        self._free: List[bool] = padded.ravel().tolist()
+        row = self.width + 2
+        # (offset in the flat padded grid, cost) of the 8 neighbours of a cell
+        self._steps: List[Tuple[int, float]] = [
+            (1, 1.0), (-1, 1.0), (row, 1.0), (-row, 1.0),
+            (row + 1, SQRT2), (row - 1, SQRT2), (-row + 1, SQRT2), (-row - 1, SQRT2)
+        ]
+
+    def _key(self, position: Point2) -> Tuple[int, int]:
+        x = min(self.width - 1, max(0, int(position[0])))
+        y = min(self.height - 1, max(0, int(position[1])))
+        return x, y
+
+    def compute(self, source: Point2) -> np.ndarray:
+        """
+        Dijkstra on the 8-connected grid from source
+        The source is allowed to be unpathable, e.g. the center of a nexus
+        """
+        x, y = self._key(source)
+        row = self.width + 2
+        free = self._free
+        dist = [math.inf] * len(free)
+        start = (y + 1) * row + x + 1
+        dist[start] = 0.0
+
+        heap = [(0.0, start)]
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            d, i = pop(heap)
+            if d > dist[i]:
+                continue
+            for step, cost in self._steps:
+                j = i + step
+                if free[j] and d + cost < dist[j]:
+                    dist[j] = d + cost
+                    push(heap, (d + cost, j))
+
+        return np.array(dist).reshape(self.height + 2, row)[1:-1, 1:-1].copy()
+
+    def field(self, source: Point2) -> np.ndarray:
+        """
+        Returns the field of source, computes it if it is not cached
+        Only for the warmup, use cached_field during steps
+        """
+        key = self._key(source)
+        if not key in self.fields:
+            self.fields[key] = self.compute(source)
+        return self.fields[key]
+
+    def cached_field(self, source: Point2) -> np.ndarray:
+        """
+        Returns the field of source, None if it was not computed in the warmup
+        """
+        return self.fields.get(self._key(source))
+
+    def precompute(self, sources: List[Point2]):
+        for source in sources:
+            self.field(source)
+
+    def distance(self, source: Point2, target: Point2) -> float:
+        """
+        Ground distance from source to target, inf if target can not be reached
+        Targets on unpathable cells (structures, minerals) use the closest pathable cell next to them
+        """
+        field = self.cached_field(source)
+        if field is None:
+            return math.hypot(target[0] - source[0], target[1] - source[1])
+        x, y = self._key(target)
+        d = field[y, x]
+        if d == np.inf:
+            window = field[max(0, y - 3):y + 4, max(0, x - 3):x + 4]
+            d = window.min()
+        return float(d)
+
+    def distances(self, source: Point2, targets: List[Point2]) -> np.ndarray:
+        """
+        Ground distances from source to all targets, without the unpathable fallback
+        """
+        field = self.cached_field(source)
+        if field is None:
+            return np.array([math.hypot(t[0] - source[0], t[1] - source[1]) for t in targets])
+        xs = np.clip(np.array([int(t[0]) for t in targets], dtype=int), 0, self.width - 1)
+        ys = np.clip(np.array([int(t[1]) for t in targets], dtype=int), 0, self.height - 1)
+        return field[ys, xs]
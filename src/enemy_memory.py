@@ -0,0 +1,89 @@
+import sc2
+from sc2.constants import *
+from sc2.unit import Unit
+from sc2.units import Units
+from sc2.position import Point2
+
+from typing import List, Tuple, Dict
+
+from combat_sim import unit_stats
+
+class EnemySnapshot:
+    """
+    What we remember about one enemy unit, from the last time we saw it
+    """
+    def __init__(self, unit: Unit, time: float):
+        self.tag: int = unit.tag
+        self.update(unit, time)
+
+    def update(self, unit: Unit, time: float):
+        self.type_id: UnitTypeId = unit.type_id
+        self.position: Point2 = unit.position
+        self.is_structure: bool = unit.is_structure
+        self.can_be_attacked: bool = unit.can_be_attacked
+        # (hp, dps, range, speed) for the combat estimator
+        self.stats: Tuple[float, float, float, float] = unit_stats(unit)
+        self.last_seen: float = time
+
+    def __repr__(self):
+        return "EnemySnapshot({}, {}, {})".format(self.type_id, self.position, self.last_seen)
+
+
+class EnemyMemory:
+    """
+    Remembers enemy units by tag after they are out of vision
+
+    Updated incrementally from the observation each step. Units are forgotten when
+    they have not been seen for unit_ttl seconds, when we see their last position
+    without seeing them or when they are destroyed. Structures do not move so they
+    only expire when we scout the position
+    """
+    def __init__(self, unit_ttl: float = 30.0):
+        self.unit_ttl = unit_ttl
+        self.enemies: Dict[int, EnemySnapshot] = {}
+        # attackable enemies that are visible this step
+        self.visible_targets: Units = None
+        self.visible_tags: Set[int] = set()
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def update(self, bot: sc2.BotAI):
+        now = bot.time
+        visible = []
+        for group in (bot.enemy_units, bot.enemy_structures):
+            for unit in group:
+                snapshot = self.enemies.get(unit.tag)
+                if snapshot is None:
+                    self.enemies[unit.tag] = EnemySnapshot(unit, now)
+                else:
+                    snapshot.update(unit, now)
+                if unit.can_be_attacked:
+                    visible.append(unit)
+        self.visible_targets = Units(visible, bot)
+        self.visible_tags = {unit.tag for unit in visible}
+
+        expired = [
+            tag for tag, snapshot in self.enemies.items()
+            if snapshot.last_seen < now and (
+                (not snapshot.is_structure and now - snapshot.last_seen > self.unit_ttl)
+                or bot.is_visible(snapshot.position))
+        ]
+        for tag in expired:
+            del self.enemies[tag]
+
+    def remove(self, tag: int):
+        self.enemies.pop(tag, None)
+
+    def remembered(self) -> List[EnemySnapshot]:
+        """
+        Returns the enemies that are not visible this step but that we remember
+        """
+        return [snapshot for snapshot in self.enemies.values()
+                    if snapshot.can_be_attacked and not snapshot.tag in self.visible_tags]
+
+    def closest_remembered(self, position: Point2) -> EnemySnapshot:
+        """
+        Returns the closest remembered enemy to position, None if we remember nothing
+        """
+        return min(self.remembered(), key=lambda snapshot: snapshot.position.distance_to(position), default=None)
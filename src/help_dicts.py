@@ -14,6 +14,69 @@ https://liquipedia.net/starcraft2/Zerg_Units_(Legacy_of_the_Void)
 unsure about versions of game but alas, this has to do
 """
 
+
+class UnitIndex:
+    """
+    Interning table that maps each UnitTypeId of a race to a dense small integer
+
+    Used by TechTree for its requirement and producer bitmasks and for the columns
+    of its numpy cost arrays. Lookups are done on UnitTypeId.value through a list,
+    and self.ids converts an index back to the enum
+    """
+    def __init__(self, units: Set[UnitTypeId]):
+        self.ids: Tuple[UnitTypeId, ...] = tuple(sorted(units, key=lambda unit: unit.value))
+        self.size: int = len(self.ids)
+
+        # value_to_index[unit.value] is the index of unit, -1 if it is not part of the race
+        self.value_to_index: List[int] = [-1] * (max(unit.value for unit in self.ids) + 1)
+        for i, unit in enumerate(self.ids):
+            self.value_to_index[unit.value] = i
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, unit: UnitTypeId) -> bool:
+        return self.index(unit) >= 0
+
+    def index(self, unit: UnitTypeId) -> int:
+        """
+        Returns the index of unit, -1 if it is not part of this race
+        """
+        value = unit.value
+        if value >= len(self.value_to_index):
+            return -1
+        return self.value_to_index[value]
+
+    def mask(self, units) -> int:
+        """
+        Returns the bitmask of units, units from other races are ignored
+        """
+        mask = 0
+        for unit in units:
+            i = self.index(unit)
+            if i >= 0:
+                mask |= 1 << i
+        return mask
+
+    def in_mask(self, mask: int, unit: UnitTypeId) -> bool:
+        i = self.index(unit)
+        return i >= 0 and (mask >> i) & 1 == 1
+
+    def new_array(self) -> List[int]:
+        """
+        Returns a unit map as a fixed-size list, indexed by self.index(unit)
+        """
+        return [0] * self.size
+
+    def dict_to_array(self, units: Dict[UnitTypeId, int]) -> List[int]:
+        array = self.new_array()
+        for unit, amount in units.items():
+            i = self.index(unit)
+            if i >= 0:
+                array[i] = amount
+        return array
+
+
 """
 PROTOSS units
 """
@@ -60,6 +123,8 @@ PROTOSS_BUILDINGS: Set[UnitTypeId] = {
 
 PROTOSS_ALL_UNITS: Set[UnitTypeId] = PROTOSS_UNITS.union(PROTOSS_BUILDINGS)
 
+PROTOSS_INDEX = UnitIndex(PROTOSS_ALL_UNITS)
+
 def get_protoss_unit_map():
     return {x: 0 for x in PROTOSS_ALL_UNITS}
 
@@ -105,6 +170,8 @@ TERRAN_BUILDINGS: Set[UnitTypeId] = {
 
 TERRAN_ALL_UNITS: Set[UnitTypeId] = TERRAN_UNITS.union(TERRAN_BUILDINGS)
 
+TERRAN_INDEX = UnitIndex(TERRAN_ALL_UNITS)
+
 def get_terran_unit_map():
     return {x: 0 for x in TERRAN_ALL_UNITS}
 
@@ -153,5 +220,7 @@ ZERG_BUILDINGS: Set[UnitTypeId] = {
 
 ZERG_ALL_UNITS: Set[UnitTypeId] = ZERG_UNITS.union(ZERG_BUILDINGS)
 
+ZERG_INDEX = UnitIndex(ZERG_ALL_UNITS)
+
 def get_zerg_unit_map():
     return {x: 0 for x in ZERG_ALL_UNITS}
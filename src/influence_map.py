@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+import sc2
+from sc2.constants import *
+from sc2.unit import Unit
+from sc2.position import Point2
+
+from typing import List, Tuple, Dict
+
+class InfluenceMap:
+    """
+    Grid over the playable area that holds the dps and hp of friendly and enemy units
+
+    Each step only the units that moved, appeared or died are applied as deltas,
+    the map is never rebuilt. Queries use summed-area tables so that the sum over
+    any window is four array lookups
+    """
+    FRIENDLY_DPS = 0
+    FRIENDLY_HP = 1
+    ENEMY_DPS = 2
+    ENEMY_HP = 3
+
+    def __init__(self, bot: sc2.BotAI, cell_size: int = 4):
+        area = bot.game_info.playable_area
+        self.origin = (area.x, area.y)
+        self.cell_size = cell_size
+        self.rows = math.ceil(area.height / cell_size)
+        self.cols = math.ceil(area.width / cell_size)
+
+        # layers: friendly dps, friendly hp, enemy dps, enemy hp
+        self.layers = np.zeros((4, self.rows, self.cols), dtype=np.float64)
+        # tag -> (is_enemy, flat cell index, dps, hp) that is currently applied to the map
+        self.applied: Dict[int, Tuple[bool, int, float, float]] = {}
+
+        self._integral = None
+
+    def cell_of(self, position: Point2) -> Tuple[int, int]:
+        col = int((position.x - self.origin[0]) // self.cell_size)
+        row = int((position.y - self.origin[1]) // self.cell_size)
+        return min(self.rows - 1, max(0, row)), min(self.cols - 1, max(0, col))
+
+    def position_of(self, row: int, col: int) -> Point2:
+        return Point2((float(self.origin[0] + (col + 0.5) * self.cell_size),
+                       float(self.origin[1] + (row + 0.5) * self.cell_size)))
+
+    def update(self, friendly: List[Unit], enemies: List[Unit]):
+        """
+        Applies the difference between the units of this step and the last step
+        """
+        layer_idx = []
+        cells = []
+        values = []
+
+        def move(is_enemy, cell, dps, hp, sign):
+            offset = 2 if is_enemy else 0
+            layer_idx.extend((offset, offset + 1))
+            cells.extend((cell, cell))
+            values.extend((sign * dps, sign * hp))
+
+        seen = set()
+        for is_enemy, units in ((False, friendly), (True, enemies)):
+            for unit in units:
+                row, col = self.cell_of(unit.position)
+                new = (is_enemy, row * self.cols + col, unit.ground_dps, unit.health + unit.shield)
+                seen.add(unit.tag)
+                old = self.applied.get(unit.tag)
+                if old == new:
+                    continue
+                if old is not None:
+                    move(*old, -1)
+                move(*new, 1)
+                self.applied[unit.tag] = new
+
+        for tag in [tag for tag in self.applied if not tag in seen]:
+            move(*self.applied.pop(tag), -1)
+
+        if values:
+            flat = self.layers.reshape(4, -1)
+            np.add.at(flat, (np.array(layer_idx), np.array(cells)), np.array(values))
+            self._integral = None
+
+    def integral(self) -> np.ndarray:
+        """
+        Summed-area tables of all layers, padded with a zero row and column
+        """
+        if self._integral is None:
+            integral = np.zeros((4, self.rows + 1, self.cols + 1), dtype=np.float64)
+            integral[:, 1:, 1:] = self.layers.cumsum(axis=1).cumsum(axis=2)
+            self._integral = integral
+        return self._integral
+
+    def window_sum(self, layer: int, position: Point2, radius: int = 1) -> float:
+        """
+        Sum of layer over the (2*radius+1)^2 cells around position
+        """
+        row, col = self.cell_of(position)
+        r0, r1 = max(0, row - radius), min(self.rows, row + radius + 1)
+        c0, c1 = max(0, col - radius), min(self.cols, col + radius + 1)
+        s = self.integral()[layer]
+        return float(s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0])
+
+    def box_sums(self, layer: int, radius: int) -> np.ndarray:
+        """
+        Window sums around every cell of the map at once
+        """
+        s = self.integral()[layer]
+        rows = np.arange(self.rows)
+        cols = np.arange(self.cols)
+        r0 = np.clip(rows - radius, 0, self.rows)[:, None]
+        r1 = np.clip(rows + radius + 1, 0, self.rows)[:, None]
+        c0 = np.clip(cols - radius, 0, self.cols)[None, :]
+        c1 = np.clip(cols + radius + 1, 0, self.cols)[None, :]
+        return s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0]
+
+    def threat_at(self, position: Point2, radius: int = 1) -> float:
+        """
+        Enemy dps around position
+        """
+        return self.window_sum(self.ENEMY_DPS, position, radius)
+
+    def enemy_power_at(self, position: Point2, radius: int = 1) -> float:
+        """
+        Enemy dps times enemy hp around position, the Lanchester strength
+        """
+        return self.window_sum(self.ENEMY_DPS, position, radius) * self.window_sum(self.ENEMY_HP, position, radius)
+
+    def advantage_at(self, position: Point2, radius: int = 1) -> float:
+        friendly = self.window_sum(self.FRIENDLY_DPS, position, radius) * self.window_sum(self.FRIENDLY_HP, position, radius)
+        return friendly - self.enemy_power_at(position, radius)
+
+    def safest_cell(self, position: Point2, radius: int = 2) -> Point2:
+        """
+        Returns the center of the cell with the least enemy dps close to position
+        Ties go to the cell closest to position, position itself if its cell is one of them
+        """
+        row, col = self.cell_of(position)
+        r0, c0 = max(0, row - radius), max(0, col - radius)
+        window = self.layers[self.ENEMY_DPS, r0:row + radius + 1, c0:col + radius + 1]
+        least = window.min()
+        if window[row - r0, col - c0] <= least:
+            return position
+        cells = np.argwhere(window == least)
+        r, c = min(cells, key=lambda cell: (cell[0] + r0 - row)**2 + (cell[1] + c0 - col)**2)
+        return self.position_of(r0 + r, c0 + c)
+
+    def strongest_advantage(self, radius: int = 1) -> Tuple[Point2, float]:
+        """
+        Returns the position on the map where our local advantage is the largest
+        """
+        advantage = self.box_sums(self.FRIENDLY_DPS, radius) * self.box_sums(self.FRIENDLY_HP, radius) \
+                  - self.box_sums(self.ENEMY_DPS, radius) * self.box_sums(self.ENEMY_HP, radius)
+        row, col = np.unravel_index(np.argmax(advantage), advantage.shape)
+        return self.position_of(row, col), float(advantage[row, col])
@@ -0,0 +1,93 @@
+import collections
+import logging
+import os
+import sys
+import threading
+
+from typing import List, Tuple, Dict
+
+"""
+Leveled logging for the bot
+
+Log calls on the game loop only append the record to an in-memory ring buffer,
+formatting and writing is done by a background thread. Messages use lazy
+%-formatting, so calls below the current level cost no formatting at all:
+
+    logger.debug("state: %s", state)    # str(state) only if DEBUG is enabled
+
+The level defaults to INFO and can be set with the UBOT_LOG_LEVEL environment
+variable (e.g. UBOT_LOG_LEVEL=DEBUG for a full trace)
+"""
+
+ROOT_NAME = "ubot"
+FORMAT = "%(relativeCreated)8.0f %(levelname)-7s %(name)s: %(message)s"
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the records in a bounded deque that a background thread flushes
+    If the game loop logs faster than we write, the oldest records are dropped
+    """
+    def __init__(self, capacity: int = 10000, flush_interval: float = 0.5, stream=None):
+        logging.Handler.__init__(self)
+        self.buffer = collections.deque(maxlen=capacity)
+        self.stream = stream if stream is not None else sys.stdout
+        self.flush_interval = flush_interval
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ubot-log-flush", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        # deque.append is thread-safe, the record is formatted when it is flushed
+        self.buffer.append(record)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                record = self.buffer.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        logging.Handler.close(self)
+
+
+_handler: RingBufferHandler = None
+
+def setup_logging(level=None, capacity: int = 10000, flush_interval: float = 0.5) -> logging.Logger:
+    """
+    Attaches the ring buffer handler to the "ubot" logger, only the first call has an effect
+    """
+    global _handler
+    root = logging.getLogger(ROOT_NAME)
+    if _handler is not None:
+        return root
+
+    if level is None:
+        level = os.environ.get("UBOT_LOG_LEVEL", "INFO").upper()
+    _handler = RingBufferHandler(capacity, flush_interval)
+    _handler.setFormatter(logging.Formatter(FORMAT))
+    root.addHandler(_handler)
+    root.setLevel(level)
+    root.propagate = False
+    return root
+
+def set_level(level):
+    logging.getLogger(ROOT_NAME).setLevel(level)
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger("{}.{}".format(ROOT_NAME, name))
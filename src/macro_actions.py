@@ -0,0 +1,82 @@
+import sc2
+from sc2.constants import *
+
+from typing import List, Tuple, Dict
+
+from buildorder_state import BuildorderState
+from tech_tree import get_tech_tree
+from race_rules import WORKERS_PER_GAS
+
+"""
+Macro-actions for the buildorder search
+
+Long runs of probes or of the same unit make the search tree blow up, as every
+single order is a new level. A macro-action is a sequence of orders that the
+search branches on as one step. Applying it builds the orders one by one, so
+the plan of the state still holds single orders that can go to build_queue
+"""
+
+class MacroAction:
+    def __init__(self, name: str, orders: Tuple[UnitTypeId, ...]):
+        self.name = name
+        self.orders = orders
+
+    def __repr__(self):
+        return "MacroAction({}, {})".format(self.name, len(self.orders))
+
+    def within_bounds(self, state: BuildorderState, bounds: Dict[UnitTypeId, int]) -> bool:
+        counts = {}
+        for order in self.orders:
+            counts[order] = counts.get(order, 0) + 1
+        for order, amount in counts.items():
+            if state.get_number_of_unit(order) + amount > bounds.get(order, 0):
+                return False
+        return True
+
+    def apply(self, state: BuildorderState, bot) -> bool:
+        """
+        Builds all orders on state, each as soon as possible
+        Returns False if one of the orders can not be built, state is then invalid
+        """
+        for order in self.orders:
+            ticks_until = state.when(order)
+            if ticks_until < 0:
+                return False
+            state.sim(ticks_until, bot)
+            if not state.build(order, bot):
+                return False
+        return True
+
+
+def get_macro_actions(state: BuildorderState, goal: Dict[UnitTypeId, int],
+                      bounds: Dict[UnitTypeId, int], bot) -> List[MacroAction]:
+    """
+    Returns the macro-actions that make sense in state:
+    workers until the bases are saturated, the remaining amount of each goal unit
+    and a supply provider followed by the goal units that fill its supply
+    """
+    macros = []
+    rules = get_tech_tree(bot).rules
+    worker, provider = rules.worker, rules.supply_provider
+
+    saturation = 16 * state.get_number_of_unit(rules.townhall) \
+               + WORKERS_PER_GAS * state.get_number_of_unit(rules.gas_building)
+    workers = min(bounds.get(worker, 0), saturation) - state.get_number_of_unit(worker)
+    if workers > 1:
+        macros.append(MacroAction("workers until saturation", (worker,) * workers))
+
+    for unit_id, amount in goal.items():
+        if unit_id == worker:
+            continue
+        left = min(amount, bounds.get(unit_id, amount)) - state.get_number_of_unit(unit_id)
+        if left > 1:
+            macros.append(MacroAction("{} of {}".format(left, unit_id), (unit_id,) * left))
+
+        supply = bot.calculate_supply_cost(unit_id)
+        if left > 0 and supply > 0:
+            # supply is a float in the game data
+            batch = min(left, int(rules.supply_per_provider // supply))
+            if batch > 0:
+                macros.append(MacroAction("{} and {} of {}".format(provider, batch, unit_id), (provider,) + (unit_id,) * batch))
+
+    return [macro for macro in macros if macro.within_bounds(state, bounds)]
@@ -1,10 +1,14 @@
 import random
 
+import numpy as np
+
 import sc2
 from sc2 import Race, Difficulty
 from sc2.constants import *
 from sc2.player import Bot, Computer
 from sc2.unit import Unit
+from sc2.position import Point2
+from sc2.units import Units
 
 from typing import List, Tuple, Dict
 
@@ -14,6 +18,10 @@ from sc2.dicts.upgrade_researched_from import UPGRADE_RESEARCHED_FROM
 from sc2.dicts.unit_research_abilities import RESEARCH_INFO
 
 from base_manager import BaseManager
+from enemy_memory import EnemyMemory
+from influence_map import InfluenceMap
+import combat_sim
+from command_grouper import CommandGrouper
 
 
 ARMY_UNITS = [ZEALOT, STALKER, IMMORTAL]
@@ -38,33 +46,136 @@ class ManagerArmy(BaseManager):
         self.squads: List[List[Unit]] = []
         self.state = "DEFENCE"
         self.squad_size = 5
+        # True when there are enemies to fight, used to step the game finer
+        self.in_combat = False
+        # enemies we have seen, also the ones that are out of vision now
+        self.enemy_memory = EnemyMemory()
+        # dps and hp of both armies over the map, created in on_start
+        self.influence: InfluenceMap = None
+        # enemies closer than this to the closest enemy of a squad take part in its fight
+        self.engage_radius = 12
+        # we only engage if the squad is predicted to keep this fraction of its hp
+        self.engage_margin = 0.2
+        # distance on top of the enemy range where a losing squad retreats instead of waiting
+        self.reach_margin = 4
+        # merges the unit commands of a step into multi-unit actions
+        self.grouper = CommandGrouper()
+        # enemies closer than this (ground distance) to our ramp are attacked by the defending army
+        self.defence_range = 40
         pass
 
+    def closest_by_ground(self, bot: sc2.BotAI, targets: Units, source: Point2) -> Tuple[Unit, float]:
+        """
+        Returns the target with the shortest ground distance to source (a key location)
+        and that distance, through the cached distance field of source
+        """
+        distances = bot.distance_fields.distances(source, [target.position for target in targets])
+        i = int(distances.argmin())
+        return targets[i], float(distances[i])
+
+    def plan_engagements(self, bot: sc2.BotAI, squads: List[List[Unit]]) -> List[Tuple[str, Point2]]:
+        """
+        Scores the fight of every squad against the enemies around its closest enemy,
+        with the combat estimator on everything we remember about the enemy
+        Returns (decision, target position) for each squad
+        """
+        enemies = [snapshot for snapshot in self.enemy_memory.enemies.values()
+                        if snapshot.can_be_attacked and (snapshot.stats[1] > 0 or not snapshot.is_structure)]
+        if not enemies:
+            # nothing that fights back, go for the closest enemy we know of
+            plans = []
+            for squad in squads:
+                remembered = self.enemy_memory.closest_remembered(squad[0].position)
+                plans.append((combat_sim.ENGAGE, remembered.position if remembered else bot.enemy_start_locations[0]))
+            return plans
+
+        enemy_pos = np.array([(snapshot.position.x, snapshot.position.y) for snapshot in enemies])
+        enemy_stats = np.array([snapshot.stats for snapshot in enemies])
+
+        friendly_stats = np.array([combat_sim.unit_stats(unit) for squad in squads for unit in squad])
+        groups = np.array([i for i, squad in enumerate(squads) for unit in squad])
+        centers = np.array([np.mean([(unit.position.x, unit.position.y) for unit in squad], axis=0) for squad in squads])
+
+        # the closest enemy of each squad is what it fights, together with everything around it
+        to_enemies = np.linalg.norm(centers[:, None, :] - enemy_pos[None, :, :], axis=2)
+        closest = to_enemies.argmin(axis=1)
+        targets = enemy_pos[closest]
+        mask = np.linalg.norm(targets[:, None, :] - enemy_pos[None, :, :], axis=2) < self.engage_radius
+
+        friendly = combat_sim.side_totals(friendly_stats, groups, len(squads))
+        enemy = combat_sim.mask_totals(enemy_stats, mask)
+        friendly_left, enemy_left = combat_sim.simulate(friendly, enemy)
+
+        # the enemy can reach us if we are inside its range plus what it walks in a few seconds
+        reach = enemy[:, combat_sim.RANGE] + 3 * enemy[:, combat_sim.SPEED] + self.reach_margin
+        in_reach = to_enemies[np.arange(len(squads)), closest] < reach
+        decisions = combat_sim.decide(friendly_left, enemy_left, in_reach, self.engage_margin)
+        return [(decision, Point2(tuple(target))) for decision, target in zip(decisions, targets)]
+
     async def on_step(self, bot: sc2.BotAI, iteration):
+        self.issue_commands(bot)
+        # the commands of all units are issued together, grouped by ability and target
+        self.grouper.flush(bot)
+
+    def issue_commands(self, bot: sc2.BotAI):
         ramp_pos = bot.main_base_ramp.protoss_wall_warpin
+
+        # all visible enemy units that can be attacked, invis units are filtered out
+        self.enemy_memory.update(bot)
+        targets = self.enemy_memory.visible_targets
+        self.in_combat = bool(targets)
+
+        # the units in self.army and self.squads are from when they were created, these are from this step
+        own_army = bot.units.of_type(ARMY_UNITS)
+        own = {unit.tag: unit for unit in own_army}
+
         if self.state == "DEFENCE":
             if len(self.army) >= self.squad_size:
                 self.squads.append(self.army.copy())
                 self.army.clear()
+            defend_pos = ramp_pos
+            if targets and self.army:
+                # attack the enemy that has come furthest towards our ramp
+                target, distance = self.closest_by_ground(bot, targets, ramp_pos)
+                if distance < self.defence_range:
+                    defend_pos = target.position
             for unit in self.army:
-                bot.do(unit.attack(ramp_pos))
-            
-        # select all enemy units, filter out invis units
-        targets = (bot.enemy_units | bot.enemy_structures).filter(lambda unit: unit.can_be_attacked)
-        for squad in self.squads:
-            for unit in squad:
-                if targets:
-                    target = targets.closest_to(unit)
-                    bot.do(unit.attack(target))
-                else:
-                    bot.do(unit.attack(bot.enemy_start_locations[0]))
+                if unit.tag in own:
+                    self.grouper.attack(own[unit.tag], defend_pos)
+
+        self.influence.update(own_army, targets.filter(lambda unit: unit.ground_dps > 0 or not unit.is_structure))
 
+        squads = [[own[unit.tag] for unit in squad if unit.tag in own] for squad in self.squads]
+        squads = [live for live in squads if live]
+        if not squads:
+            return
+
+        for live, (decision, target_pos) in zip(squads, self.plan_engagements(bot, squads)):
+            if decision == combat_sim.ENGAGE:
+                for unit in live:
+                    target = targets.closest_to(unit) if targets else target_pos
+                    self.grouper.attack(unit, target)
+            elif decision == combat_sim.RETREAT:
+                # we would lose, fall back to the ramp where new units join
+                for unit in live:
+                    self.grouper.move(unit, ramp_pos)
+            else:
+                # hold where the enemy threat is the lowest until the odds change
+                wait_pos = self.influence.safest_cell(live[0].position)
+                for unit in live:
+                    self.grouper.attack(unit, wait_pos)
+
+
+    async def on_start(self, bot: sc2.BotAI):
+        self.influence = InfluenceMap(bot)
 
     async def on_unit_created(self, bot: sc2.BotAI, unit: Unit):
         if unit.type_id in ARMY_UNITS:
             self.army.append(unit)
 
     async def on_unit_destroyed(self, bot: sc2.BotAI, unit_tag: int):
+        self.enemy_memory.remove(unit_tag)
+
         for unit in self.army:
             if unit.tag == unit_tag:
                 self.army.remove(unit)
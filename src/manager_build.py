@@ -1,11 +1,17 @@
+import math
 import random
-from queue import PriorityQueue 
+import time
 from copy import copy, deepcopy
 
 import sc2
 from sc2 import Race, Difficulty
 from sc2.constants import *
 from sc2.player import Bot, Computer
+from sc2.data import ActionResult
+from sc2.position import Point2
+from sc2.units import Units
+
+import numpy as np
 
 from typing import List, Tuple, Dict
 
@@ -15,7 +21,14 @@ from sc2.dicts.upgrade_researched_from import UPGRADE_RESEARCHED_FROM
 from sc2.dicts.unit_research_abilities import RESEARCH_INFO
 
 from base_manager import BaseManager
-from buildorder_state import BuildorderState
+from buildorder_state import BuildorderState, MINERALS_PER_TICK, VESPENE_PER_TICK
+from open_list import OpenList
+from macro_actions import get_macro_actions
+from tech_tree import get_tech_tree
+from race_rules import WORKERS_PER_GAS
+from logger import get_logger
+
+logger = get_logger("build")
 
 class ManagerBuild(BaseManager):
     """
@@ -31,6 +44,39 @@ class ManagerBuild(BaseManager):
         """
         #self.build_queue: List[UnitTypeId] = [PROBE, PROBE, PYLON, PROBE, ASSIMILATOR, GATEWAY, PROBE, PYLON, PROBE, PROBE, CYBERNETICSCORE, PROBE, STALKER]
         self.build_queue = []
+        # what the opening plan should reach, it is planned in on_start
+        self.opening_goal: Dict[UnitTypeId, int] = {PROBE: 20, PYLON: 1, ZEALOT: 4}#, GATEWAY: 1, STALKER: 1}
+
+        # game loop where each item of build_queue is due, from simulating the plan
+        self.schedule: List[int] = []
+        # the executor sleeps until wake_loop, until we can afford wake_cost
+        # or until an event that frees a producer happens
+        self.wake_loop = 0
+        self.wake_cost: Tuple[int, int] = None
+        self.wake_event = False
+        # how long we sleep when the simulation can not tell when an item is due
+        self.retry_ticks = 22
+
+        # upper bound on the number of states the buildorder search keeps in memory
+        self.max_search_states = 20000
+        # branch on macro-actions (see macro_actions.py) as well as single orders, off as they
+        # did not make the search expand fewer states at the same makespan for any goal we tried
+        self.use_macro_actions = False
+        # skip interleavings of independent orders, see calculate_buildorder
+        self.use_order_reduction = True
+        # total wall time spent in calculate_buildorder, in seconds
+        self.planner_time = 0.0
+        # of the last search: the tick where the last order of the best plan starts (what the
+        # search minimizes), the tick where its goal units are done and the number of expanded orders
+        self.last_plan_ticks = 0
+        self.last_plan_done = 0
+        self.last_expansions = 0
+
+        # how many items at the front of build_queue the dispatcher tries to start each step
+        self.dispatch_window = 8
+
+        # pylon tag -> pathable positions in its power field, where we can try to warp in
+        self.warp_spots: Dict[int, List[Point2]] = {}
 
     async def build_unit(self, bot : sc2.BotAI, unit_id : UnitTypeId) -> bool:
         """
@@ -43,29 +89,29 @@ class ManagerBuild(BaseManager):
             return False
 
         build_req = self.build_info(unit_id)
+        pylon = bot.queries.ready_structures(bot, PYLON).random_or(None)
+        nexus = bot.queries.structures(bot, NEXUS).random_or(None)
         for from_id, build_dict in build_req:
             # we handle structures and probes seperately
             requires_power = "requires_power" in build_dict
-            pylon = bot.structures(PYLON).ready.random_or(None)
-            nexus = bot.structures(NEXUS).random
 
             if requires_power and not pylon:
                 return False
 
             if "required_building" in build_dict and not \
-                    bot.structures(build_dict["required_building"]).ready.amount >= 1:
+                    bot.queries.ready_structures(bot, build_dict["required_building"]).amount >= 1:
                 return False
 
             if from_id == PROBE:
                 # Here we need a big switch case for all unique buildings
                 if unit_id == ASSIMILATOR:
-                    for th in bot.townhalls.ready:
+                    for th in bot.queries.ready_townhalls(bot):
                         # Find all vespene geysers that are closer than range 10 to this townhall
                         # Can currently only build at townhalls that are ready, consider fixing this
                         vgs = bot.vespene_geyser.closer_than(10, th)
                         for vg in vgs:
                             if await bot.can_place(ASSIMILATOR , vg.position): 
-                                workers = bot.workers.gathering
+                                workers = self.free_workers(bot)
                                 if workers:  # same condition as above
                                     worker = workers.closest_to(vg)
                                     # Caution: the target for the refinery has to be
@@ -78,7 +124,11 @@ class ManagerBuild(BaseManager):
                     pass
 
                 else:
-                    await bot.build(unit_id, near=pylon if requires_power else nexus) 
+                    near = pylon if requires_power else nexus
+                    # a worker that got an order this step is already building something else
+                    workers = self.free_workers(bot)
+                    worker = workers.closest_to(near) if workers else None
+                    await bot.build(unit_id, near=near, build_worker=worker)
                     return True
                     
 
@@ -86,7 +136,9 @@ class ManagerBuild(BaseManager):
                 if from_id == WARPGATE:
                     # we need to handle this seperately
                     continue
-                building = bot.structures(from_id).ready.idle.random_or(None)
+                # buildings that got an order this step are still idle in the observation
+                building = bot.queries.ready_structures(bot, from_id).idle.filter(
+                    lambda structure: not structure.tag in bot.unit_tags_received_action).random_or(None)
                 if not building:
                     # no building is ready, if we have no such building then we need replan
                     return False
@@ -97,6 +149,98 @@ class ManagerBuild(BaseManager):
         return False
 
 
+    def free_workers(self, bot: sc2.BotAI) -> Units:
+        """
+        Workers that mine or idle and have not been given an order this step
+        """
+        return bot.workers.filter(lambda worker: (worker.is_gathering or worker.is_idle)
+                                    and not worker.tag in bot.unit_tags_received_action)
+
+    async def dispatch(self, bot: sc2.BotAI) -> List[int]:
+        """
+        Walks the first dispatch_window items of build_queue and issues every item that can start now
+        An item that can not start keeps its cost and supply reserved, and later items only
+        go ahead of it if they are independent of it (see TechTree.is_independent) and fit
+        in what is left. Producers are reserved through bot.unit_tags_received_action
+        Returns the indices of the issued items
+        """
+        tech_tree = get_tech_tree(bot)
+        issued = []
+        blocked = []
+        reserved_minerals, reserved_vespene, reserved_supply = 0, 0, 0
+        for i, unit_id in enumerate(self.build_queue[:self.dispatch_window]):
+            minerals, vespene, _ = tech_tree.cost[unit_id]
+            supply = tech_tree.supply_cost[unit_id]
+
+            can_start = all(tech_tree.is_independent(other, unit_id) for other in blocked) \
+                and bot.minerals - reserved_minerals >= minerals \
+                and bot.vespene - reserved_vespene >= vespene \
+                and (supply == 0 or bot.supply_left - reserved_supply >= supply)
+            # build_unit subtracts the cost and supply of what it issues from bot
+            if can_start and await self.build_unit(bot, unit_id):
+                issued.append(i)
+                continue
+
+            blocked.append(unit_id)
+            reserved_minerals += minerals
+            reserved_vespene += vespene
+            reserved_supply += supply
+        return issued
+
+    def get_warp_spots(self, bot: sc2.BotAI) -> List[Point2]:
+        """
+        Returns candidate warp-in positions around all ready pylons
+        The positions of a pylon are computed once and cached by its tag
+        """
+        pylons = bot.structures(PYLON).ready
+        tags = pylons.tags
+        for tag in [tag for tag in self.warp_spots if not tag in tags]:
+            del self.warp_spots[tag]
+
+        spots = []
+        for pylon in pylons:
+            if not pylon.tag in self.warp_spots:
+                # 2 apart so that units warped in at the same time do not overlap
+                candidates = [pylon.position.offset((dx, dy))
+                              for dx in range(-6, 7, 2) for dy in range(-6, 7, 2)
+                              if 0 < dx*dx + dy*dy <= 36]
+                self.warp_spots[pylon.tag] = [pos for pos in candidates if bot.in_pathing_grid(pos)]
+            spots.extend(self.warp_spots[pylon.tag])
+        return spots
+
+    async def warp_in_units(self, bot: sc2.BotAI, unit_ids: List[UnitTypeId]) -> int:
+        """
+        Warps in the units of unit_ids, in order, from every warpgate that is off cooldown
+        All warp-ins are issued in this step, stops at the first unit we can not afford
+        Returns the number of units that were warped in
+        """
+        warpgates = bot.structures(WARPGATE).ready
+        if not warpgates or not unit_ids:
+            return 0
+
+        abilities = await bot.get_available_abilities(warpgates)
+        ready = list(zip(warpgates, abilities))
+        spots = self.get_warp_spots(bot)
+        if not spots:
+            return 0
+
+        # one placement query for all spots, the warp-ins are then spread over the free ones
+        first_ability = TRAIN_INFO[WARPGATE][unit_ids[0]]["ability"]
+        results = await bot._client.query_building_placement(bot._game_data.abilities[first_ability.value], spots)
+        free = [pos for pos, result in zip(spots, results) if result == ActionResult.Success]
+
+        issued = 0
+        for unit_id in unit_ids:
+            ability = TRAIN_INFO[WARPGATE][unit_id]["ability"]
+            warpgate = next((w for w, available in ready if ability in available), None)
+            if warpgate is None or not free or not bot.can_afford(unit_id):
+                break
+
+            bot.do(warpgate.warp_in(unit_id, free.pop(0)), subtract_cost=True, subtract_supply=True)
+            ready = [(w, available) for w, available in ready if w.tag != warpgate.tag]
+            issued += 1
+        return issued
+
     def build_info(self, unit_id : UnitTypeId) -> List[Tuple[UnitTypeId, Dict]]:
         """
         Returns a list of pairs: [UnitTypeId, {"ability" : AbilityId, constraints}] 
@@ -121,6 +265,9 @@ class ManagerBuild(BaseManager):
         vespene = bot.vespene
         
         w_minerals, w_vespene = bot.m_resources.workers_working(bot)
+        if w_minerals + w_vespene == 0:
+            # before the first step no worker is assigned yet, they will all mine minerals
+            w_minerals = bot.workers.amount
         supply = bot.supply_used
         supply_cap = bot.supply_cap
         
@@ -149,10 +296,10 @@ class ManagerBuild(BaseManager):
                 # apparently difficult to get the UnitTypeId from AbilityId in a nice way, might wanna create our own dict for that
                 # however, we can just disregard this as of now
                 #TODO add unit being created to busy_units
-                busy_units.append((structure.type_id, (1-progress) * cost_time))
+                busy_units.append((structure.type_id, (1-progress) * cost_time, False))
             else:
                 # this "should" not happen xd
-                print("ERROR, PLEASE LOOK FOR THIS IN MANAGER_BUILD")
+                logger.error("Structure %s is neither idle, busy nor under construction", structure.type_id)
 
         for unit in bot.units:
             if not unit.type_id in units:
@@ -173,17 +320,101 @@ class ManagerBuild(BaseManager):
         return dis
 
 
+    def estimate_goals(self, goals: List[Dict[UnitTypeId, int]], state: BuildorderState) -> List[Tuple[int, int]]:
+        """
+        Returns (lower, upper) bounds on the ticks until the units of each goal are done,
+        without searching. (-1, -1) if a goal can not be reached (e.g. no mineral workers)
+        They bound last_plan_done of calculate_buildorder, not last_plan_ticks which is
+        when the last order starts
+
+        lower: the longest tech chain of the goal, or the time to mine its cost
+               if every new worker mined from now on
+        upper: every order built one after the other once everything that is busy is done,
+               with the workers we have now
+        Both count the missing producers and requirements of the goal (see TechTree.build_chain)
+        """
+        tech_tree = get_tech_tree(state.bot)
+        rules = tech_tree.rules
+        index = tech_tree.index
+        col = index.index
+
+        counts = np.array(index.new_array(), dtype=np.float64)
+        for unit_id, amount in state.units.items():
+            if unit_id in index:
+                counts[col(unit_id)] += amount
+        for busy_unit in state.busy_units:
+            if busy_unit.unit_id in index:
+                counts[col(busy_unit.unit_id)] += 1
+
+        wanted = np.array([index.dict_to_array(goal) for goal in goals], dtype=np.float64)
+        orders = np.maximum(wanted - counts, 0)
+        # producers and requirements that are not part of the goal are built once
+        needed = (wanted > 0).astype(np.float64) @ tech_tree.build_chain_array > 0
+        orders += needed & (counts == 0) & (orders == 0)
+
+        # supply providers for the supply that the orders do not bring themselves
+        supply = state.supply + orders @ tech_tree.supply_array
+        provided = min(state.supply_cap, 200) + orders @ np.array([rules.supply.get(unit, 0) for unit in index.ids])
+        orders[:, col(rules.supply_provider)] += np.ceil(np.maximum(supply - provided, 0) / rules.supply_per_provider)
+
+        # goals that cost vespene get a gas building if there is none, like in calculate_buildorder
+        vespene = np.maximum(orders @ tech_tree.cost_array[:, 1] - state.vespene, 0)
+        gas = col(rules.gas_building)
+        orders[:, gas] += (vespene > 0) & (counts[gas] + orders[:, gas] == 0)
+        gas_buildings = counts[gas] + orders[:, gas]
+        minerals = np.maximum(orders @ tech_tree.cost_array[:, 0] - state.minerals, 0)
+
+        ready = {unit_id: 0 for unit_id, amount in state.units.items() if amount > 0}
+        for busy_unit in state.busy_units:
+            ready[busy_unit.unit_id] = min(ready.get(busy_unit.unit_id, math.inf), busy_unit.ticks_left)
+        busy_ticks = max((busy_unit.ticks_left for busy_unit in state.busy_units), default=0)
+        if set(ready) == rules.start_units:
+            # nothing was built yet, the precomputed paths from the start units hold
+            path = tech_tree.critical_path_array
+        else:
+            memo = {}
+            path = np.array([tech_tree.ticks_until_exists(unit, ready, memo) if unit in tech_tree.units else 0
+                                for unit in index.ids])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w_minerals_max = state.w_minerals + orders[:, col(rules.worker)]
+            w_vespene_max = np.maximum(state.w_vespene, WORKERS_PER_GAS * gas_buildings)
+            lower = np.maximum.reduce([
+                np.where(orders > 0, path, 0).max(axis=1),
+                np.where(minerals > 0, minerals / (MINERALS_PER_TICK * w_minerals_max), 0),
+                np.where(vespene > 0, vespene / (VESPENE_PER_TICK * w_vespene_max), 0)
+            ])
+
+            # workers that move to new gas buildings stop mining minerals
+            w_minerals_now = np.maximum(state.w_minerals - WORKERS_PER_GAS * orders[:, gas], min(state.w_minerals, 1))
+            w_vespene_now = np.where(gas_buildings > 0, max(state.w_vespene, WORKERS_PER_GAS), state.w_vespene)
+            upper = busy_ticks + orders @ tech_tree.cost_array[:, 2] \
+                  + np.where(minerals > 0, minerals / (MINERALS_PER_TICK * w_minerals_now), 0) \
+                  + np.where(vespene > 0, vespene / (VESPENE_PER_TICK * w_vespene_now), 0)
+
+        bounds = []
+        for low, high in zip(lower, upper):
+            if not (np.isfinite(low) and np.isfinite(high)):
+                bounds.append((-1, -1))
+            else:
+                bounds.append((int(low), int(math.ceil(high))))
+        return bounds
+
     def calculate_buildorder(self, goal: Dict[UnitTypeId, int], bot) -> List[UnitTypeId]:
+        start = time.perf_counter()
         current_bo_state = self.get_buildorder_state(bot)
 
         best_plan: List[UnitTypeId] = []
         best_plan_ticks: int = 100000000
+        best_plan_done: int = best_plan_ticks
         
-        states = PriorityQueue()
+        states = OpenList(self.max_search_states)
         iteration_major = 0
         iteration_expand = 0
 
-        orders = [PROBE, PYLON]
+        tech_tree = get_tech_tree(bot)
+        rules = tech_tree.rules
+        orders = [rules.worker, rules.supply_provider]
         states.put(current_bo_state)
 
         # create a upper bound on units that are to be built
@@ -197,66 +428,64 @@ class ManagerBuild(BaseManager):
             else:
                 bounds[unit_id] = max(bounds[unit_id], amount)
 
-            creators = list(UNIT_TRAINED_FROM[unit_id])
-            for creator in creators:
-                if creator == WARPGATE:
-                    continue
+            # the producer we build for the unit, enough of them to produce all at once
+            for creator in tech_tree.planned_producers[unit_id]:
                 if not creator in orders:
                     orders.append(creator)
+                bounds[creator] = max(bounds.get(creator, 0), amount)
 
-                if not creator in bounds:
-                    bounds[creator] = amount
-                else:
-                    bounds[creator] = max(bounds[creator], amount)
-
-            req = unit_id # TODO this is also used in buildorder_state, fix this
-            while req not in orders:
-                orders.append(req)
-                if not req in bounds:
-                    bounds[req] = 1
-                else:
-                    bounds[req] = max(bounds[req], 1)
-
-                # if a requirement requires vespene, we add that to the orders
-                if bot.calculate_cost(req).vespene > 0:
-                    if not ASSIMILATOR in orders:
-                        orders.append(ASSIMILATOR)
+            # the requirements and producers of the unit, and their requirements and producers
+            for req in tech_tree.build_chain[unit_id]:
+                bounds[req] = max(bounds.get(req, 0), 1)
+                if not req in orders:
+                    orders.append(req)
 
-                if req in PROTOSS_TECH_REQUIREMENT:
-                    req = PROTOSS_TECH_REQUIREMENT[req]
-                else:
-                    break
+            # if a requirement requires vespene, we add that to the orders
+            if tech_tree.requires_vespene[unit_id] and not rules.gas_building in orders:
+                orders.append(rules.gas_building)
             
-            max_supply += bot.calculate_supply_cost(req) * amount
+            max_supply += bot.calculate_supply_cost(unit_id) * amount
 
 
         # special case bounds
-        if NEXUS in goal:
-            bounds[NEXUS] = goal[NEXUS]
+        townhall, provider, gas_building = rules.townhall, rules.supply_provider, rules.gas_building
+        if townhall in goal:
+            bounds[townhall] = goal[townhall]
         else:
-            bounds[NEXUS] = current_bo_state.get_number_of_unit(NEXUS)
-        bounds[PYLON] = max(bounds[PYLON], (max_supply+4-15) // 8) # round the number of pylons up
-        if ASSIMILATOR in goal:
-            bounds[ASSIMILATOR] = goals[ASSIMILATOR]
+            bounds[townhall] = current_bo_state.get_number_of_unit(townhall)
+        # the providers we have and enough new ones for the supply of the goal, rounded up
+        per_provider = rules.supply_per_provider
+        missing_supply = current_bo_state.supply + max_supply - current_bo_state.supply_cap
+        bounds[provider] = max(bounds.get(provider, 0),
+                               current_bo_state.get_number_of_unit(provider) + int(math.ceil(max(0, missing_supply) / per_provider)))
+        if gas_building in goal:
+            bounds[gas_building] = goal[gas_building]
         else:
-            bounds[ASSIMILATOR] = bounds[NEXUS] * 2 if ASSIMILATOR in orders else 0
+            bounds[gas_building] = bounds[townhall] * 2 if gas_building in orders else 0
         
-        bounds[CYBERNETICSCORE] = 1
-        bounds[TWILIGHTCOUNCIL] = 1
-        bounds[DARKSHRINE] = 1
-        bounds[TEMPLARARCHIVE] = 1
-        bounds[ROBOTICSBAY] = 1
-        bounds[FLEETBEACON] = 1
-
-        print("To build: {} \nthe following orders are required: {}".format(goal, orders))
-        print("Bounds: {}".format(bounds))
+        # we never need more than one of the buildings that only unlock tech
+        for tech_building in tech_tree.tech_buildings:
+            bounds[tech_building] = 1
+
+        logger.debug("To build: %s, the following orders are required: %s", goal, orders)
+        logger.debug("Bounds: %s", bounds)
+
+        # partial-order reduction: two independent orders that both start right away
+        # lead to the same state in both interleavings, so they are only expanded in
+        # the order they have in orders. If one of them has to wait, the interleavings
+        # start at different ticks and both are kept. States from macro-actions have
+        # no last_order, the other interleaving of a macro is not part of the search
+        rank = {order: i for i, order in enumerate(orders)}
+        independent = set()
+        if self.use_order_reduction:
+            independent = {(a, b) for a in orders for b in orders if tech_tree.is_independent(a, b)}
 
         max_iteration_major = 500
         while not states.empty() and iteration_major < max_iteration_major:
             iteration_major += 1
             cur = states.get()
 
-            print("Current expand iteration: {} and plan: {}".format(iteration_major, cur))
+            logger.debug("Current expand iteration: %d and plan: %s", iteration_major, cur)
             # check if we fullfill goal
             units_left = {}
             for unit_id, amount in goal.items():
@@ -270,17 +499,17 @@ class ManagerBuild(BaseManager):
                 if cur.ticks < best_plan_ticks:
                     best_plan = cur.plan
                     best_plan_ticks = cur.ticks
+                    best_plan_done = cur.ticks + max((busy_unit.ticks_left for busy_unit in cur.busy_units
+                                                        if busy_unit.unit_id in goal), default=0)
                     #print(" the plan was better: {}\n".format(cur.plan))
                     continue
 
             if cur.ticks > best_plan_ticks:
-                print()
                 continue
 
             # go through all orders
+            last = cur.last_order
             for order in orders:
-                iteration_expand += 1
-
                 if cur.get_number_of_unit(order) + 1 > bounds[order]:
                     continue
 
@@ -290,23 +519,118 @@ class ManagerBuild(BaseManager):
                 if ticks_until < 0:
                     continue
 
+                if ticks_until == 0 and (last, order) in independent and rank[order] < rank[last]:
+                    continue
+                iteration_expand += 1
+
                 #print(" adding {} to plan".format(order))
                 # add the new state
                 new_state = deepcopy(cur)
                 new_state.sim(ticks_until, bot)
-                new_state.build(order, bot)
+                if not new_state.build(order, bot):
+                    continue
+                new_state.last_order = order if ticks_until == 0 else None
                 
                 heuristic = self.get_distance_to_goal(goal, new_state)
                 new_state.heuristic = heuristic
                 states.put(new_state)
 
-            print()
+            # macro-actions take several orders in one step, so the search needs fewer levels
+            macros = get_macro_actions(cur, goal, bounds, bot) if self.use_macro_actions else []
+            for macro in macros:
+                iteration_expand += 1
+                new_state = deepcopy(cur)
+                if not macro.apply(new_state, bot):
+                    continue
+                new_state.last_order = None
+                new_state.heuristic = self.get_distance_to_goal(goal, new_state)
+                states.put(new_state)
             
         # at this point, we have a best plan hopefully
-        print("major iterations: {}, minor iterations: {}, ticks: {}, seconds: {}, ".format(iteration_major, iteration_expand, best_plan_ticks, best_plan_ticks/22.4))
-        print("best_plan: {}".format(best_plan))
+        logger.info("major iterations: %d, minor iterations: %d, ticks: %s, seconds: %s",
+                    iteration_major, iteration_expand, best_plan_ticks, best_plan_ticks/22.4)
+        logger.info("states pushed: %d, pruned: %d, peak: %d", states.pushed, states.pruned, states.peak)
+        logger.debug("best_plan: %s", best_plan)
+        self.planner_time += time.perf_counter() - start
+        self.last_plan_ticks = best_plan_ticks
+        self.last_plan_done = best_plan_done
+        self.last_expansions = iteration_expand
         return best_plan
         
+    def schedule_queue(self, bot: sc2.BotAI, backoff: int = 0):
+        """
+        Simulates build_queue from the current game state and records the game loop
+        where each item can be issued. Items after one that can not be simulated
+        get the same loop as that item, they are rescheduled when we get there
+        No item is due before backoff ticks from now, used after a failed attempt
+        """
+        loop = bot.state.game_loop
+        earliest = loop + backoff
+        state = self.get_buildorder_state(bot)
+        self.schedule = []
+        failed = False
+        for unit_id in self.build_queue:
+            ticks_until = -1 if failed else state.when(unit_id)
+            if ticks_until < 0:
+                failed = True
+                self.schedule.append(self.schedule[-1] if self.schedule else max(earliest, loop + self.retry_ticks))
+                continue
+            state.sim(ticks_until, bot)
+            self.schedule.append(max(earliest, loop + int(state.ticks)))
+            failed = not state.build(unit_id, bot)
+
+        self.wake_loop = self.schedule[0] if self.schedule else loop
+        self.set_wake_cost(bot)
+
+    def set_wake_cost(self, bot: sc2.BotAI):
+        """
+        If we can not afford the first item of build_queue, we also wake when we can
+        """
+        self.wake_cost = None
+        if self.build_queue and not bot.can_afford(self.build_queue[0]):
+            cost = bot.calculate_cost(self.build_queue[0])
+            self.wake_cost = (cost.minerals, cost.vespene)
+
+    def pop_queue(self, bot: sc2.BotAI, indices: List[int]):
+        """
+        Removes the items at indices that were issued, and sleeps until the next one is due
+        """
+        issued = set(indices)
+        self.build_queue = [unit_id for i, unit_id in enumerate(self.build_queue) if not i in issued]
+        self.schedule = [loop for i, loop in enumerate(self.schedule) if not i in issued]
+        self.wake_loop = self.schedule[0] if self.schedule else bot.state.game_loop
+        self.set_wake_cost(bot)
+
+    def is_due(self, bot: sc2.BotAI) -> bool:
+        """
+        Returns True if it is time to try the first item of build_queue
+        """
+        if self.wake_event or bot.state.game_loop >= self.wake_loop:
+            return True
+        if self.wake_cost and bot.minerals >= self.wake_cost[0] and bot.vespene >= self.wake_cost[1]:
+            self.wake_cost = None
+            return True
+        return False
+
+    async def on_start(self, bot: sc2.BotAI):
+        """
+        Plans the opening before the game starts, so the first step can build right away
+        """
+        plan = self.calculate_buildorder(self.opening_goal, bot)
+        logger.info("Calculated plan: %s", plan)
+        self.build_queue = plan
+        self.schedule_queue(bot)
+
+    async def on_unit_created(self, bot: sc2.BotAI, unit):
+        # a producer is idle again
+        self.wake_event = True
+
+    async def on_building_construction_complete(self, bot: sc2.BotAI, unit):
+        self.wake_event = True
+
+    async def on_unit_destroyed(self, bot: sc2.BotAI, unit_tag: int):
+        self.wake_event = True
+
     async def on_step(self, bot: sc2.BotAI, iteration):
         #cur = self.get_buildorder_state(bot)
         # add the new state
@@ -324,32 +648,38 @@ class ManagerBuild(BaseManager):
         
         #print("cur units: {}, new_state units: {}".format(cur.units, new_state.units))
         
-        if iteration == 1:
-            goal = {PROBE: 20, PYLON: 1, ZEALOT: 4}#, GATEWAY: 1, STALKER: 1}
-            plan = self.calculate_buildorder(goal, bot)
-            print("Calculated plan: {}".format(plan))
-            self.build_queue = plan
-            assert(1==2)
-
-
         if len(self.build_queue) == 0:
             return
 
         if not bot.townhalls.ready:
             for worker in bot.workers:
-                bot.do(worker.attack(self.enemy_start_locations[0]))
+                bot.do(worker.attack(bot.enemy_start_locations[0]))
+            return
+
+        if not self.is_due(bot):
+            return
+        self.wake_event = False
+
+        # warp in every gateway unit at the front of the queue that we have warpgates for
+        warp_units = []
+        for unit_id in self.build_queue:
+            if not unit_id in TRAIN_INFO[WARPGATE]:
+                break
+            warp_units.append(unit_id)
+        warped = await self.warp_in_units(bot, warp_units)
+        if warped > 0:
+            self.pop_queue(bot, range(warped))
+
+        # then everything further down the queue that can start in this step
+        build_unit = self.build_queue[0] if self.build_queue else None
+        issued = await self.dispatch(bot)
+        if issued:
+            self.pop_queue(bot, issued)
+        if warped > 0 or 0 in issued or not self.build_queue:
             return
-        else:
-            nexus = bot.townhalls.ready.random
-        
-        build_unit = self.build_queue[0]
-        current_bo_state = self.get_buildorder_state(bot)
-        time = current_bo_state.when(build_unit)
-        print("Current build order: {}".format(self.build_queue))
-        print("Current BuildorderState: {}".format(current_bo_state))
-        print("Current build: {} in ({}, {}) (ticks, seconds)".format(
-            build_unit, time, time/(22.4)))
-        print()
-        if await self.build_unit(bot, build_unit):
-            del self.build_queue[0]
 
+        # the plan was too optimistic, simulate the queue again from the real state,
+        # the simulation can say that the first item is due now, so wait at least retry_ticks
+        self.schedule_queue(bot, backoff=self.retry_ticks)
+        logger.debug("Current build: %s in %d ticks, build order: %s",
+                     build_unit, self.wake_loop - bot.state.game_loop, self.build_queue)
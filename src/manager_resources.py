@@ -5,8 +5,10 @@ from sc2 import Race, Difficulty
 from sc2.constants import *
 from sc2.player import Bot, Computer
 from sc2.unit import Unit
+from sc2.units import Units
+from sc2.position import Point2
 
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Set
 
 from sc2.dicts.unit_trained_from import UNIT_TRAINED_FROM
 from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
@@ -14,6 +16,9 @@ from sc2.dicts.upgrade_researched_from import UPGRADE_RESEARCHED_FROM
 from sc2.dicts.unit_research_abilities import RESEARCH_INFO
 
 from base_manager import BaseManager
+from logger import get_logger
+
+logger = get_logger("resources")
 
 class ManagerResources(BaseManager):
     """
@@ -30,11 +35,30 @@ class ManagerResources(BaseManager):
     handle multiple nexuses
     """
     def __init__(self):
-        pass
+        # expansion location -> tags of its mineral fields, filled in on_start
+        self.base_minerals: Dict[Point2, Set[int]] = {}
+
+    def index_bases(self, bot: sc2.BotAI):
+        """
+        Records the mineral fields of every expansion location, so we do not
+        have to search all mineral fields of the map for the ones of a base
+        """
+        self.base_minerals = {}
+        for location, resources in bot.expansion_locations.items():
+            self.base_minerals[location] = {resource.tag for resource in resources if resource.is_mineral_field}
+
+    def local_minerals(self, bot: sc2.BotAI, position: Point2) -> Units:
+        """
+        Returns the mineral fields of the base at position
+        """
+        location = min(self.base_minerals, key=lambda location: location.distance_to(position), default=None)
+        if location is None or location.distance_to(position) > 8:
+            return bot.mineral_field.closer_than(8, position)
+        return bot.mineral_field.tags_in(self.base_minerals[location])
 
     def workers_working(self, bot: sc2.BotAI) -> Tuple[int, int]:
-        bases = bot.townhalls.ready
-        gas_buildings = bot.gas_buildings.ready
+        bases = bot.queries.ready_townhalls(bot)
+        gas_buildings = bot.queries.ready_gas_buildings(bot)
 
         minerals = 0
         gas = 0
@@ -50,20 +74,19 @@ class ManagerResources(BaseManager):
         """
         Assigns unit to the closest mineral field that is not utilized
         """
-        bases = bot.townhalls.ready.sorted_by_distance_to(unit.position)
+        # ground distance, the straight line is wrong across ramps and cliffs
+        bases = sorted(bot.queries.ready_townhalls(bot),
+                       key=lambda base: bot.distance_fields.distance(base.position, unit.position))
         for mining_place in bases:
             if mining_place.surplus_harvesters < 0:
-                local_minerals = {
-                    mineral for mineral \
-                        in bot.mineral_field if mineral.distance_to(mining_place) <= 8
-                }
+                local_minerals = self.local_minerals(bot, mining_place.position)
                 target_mineral = max(local_minerals, key=lambda mineral: mineral.mineral_contents, default=None)
                 bot.do(unit.gather(target_mineral))
                 return True
         return False
 
     def assign_closest_gas(self, bot: sc2.BotAI, unit: Unit):
-        gas_buildings = bot.gas_buildings.ready.sorted_by_distance_to(unit.position)
+        gas_buildings = bot.queries.ready_gas_buildings(bot).sorted_by_distance_to(unit.position)
         
         for mining_place in gas_buildings:
             if mining_place.has_vespene and mining_place.surplus_harvesters < 0:
@@ -91,7 +114,7 @@ class ManagerResources(BaseManager):
         Returns True if all 'numbers' are full over a nexus and its assimilators
         """
         # find the assimilators close to this base
-        assimilators = bot.structures(ASSIMILATOR).closer_than(8, base.position).filter(lambda assimilator: assimilator.has_vespene)
+        assimilators = bot.queries.gas_buildings_near(bot, base)
         count = sum(map(lambda assimilator: assimilator.assigned_harvesters, assimilators))
         count += base.assigned_harvesters
         return count >= (base.ideal_harvesters + 3*assimilators.amount)
@@ -105,6 +128,9 @@ class ManagerResources(BaseManager):
                 return False
         return True
 
+    async def on_start(self, bot: sc2.BotAI):
+        self.index_bases(bot)
+
     async def on_step(self, bot: sc2.BotAI, iteration):
         # assign idle workers to closest
         w = self.workers_working(bot)
@@ -128,11 +154,9 @@ class ManagerResources(BaseManager):
         if unit_id == ASSIMILATOR:
             diff = -unit.surplus_harvesters
             if diff < 0:
-                print("ASSIMILATOR WHEN BUILT HAS 4 OR MORE ASSIGNED ALREADY")
+                logger.warning("Assimilator has %d assigned workers when it is built", unit.assigned_harvesters)
             # add three workers to it
-            local_minerals_tags = {
-                mineral.tag for mineral in bot.mineral_field if mineral.distance_to(unit.position) <= 8
-            }
+            local_minerals_tags = self.local_minerals(bot, unit.position).tags
             n_closest_workers = bot.workers.filter(lambda worker: worker.order_target in local_minerals_tags or worker.is_carrying_minerals).n_closest_to_distance(unit.position, 20, diff)
             if n_closest_workers == None:
                 # no workers close to the new built assimilator, do nothing
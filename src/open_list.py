@@ -0,0 +1,50 @@
+import heapq
+
+from typing import List, Tuple, Dict
+
+class OpenList:
+    """
+    Heap based open list for the buildorder search
+
+    queue.PriorityQueue locks on every put and get, which we do not need as the
+    search runs in a single thread. The list is also bounded: when it holds more
+    than max_states, the worst states are evicted (like SMA*) so that the memory
+    used by the search stays predictable. Items are ordered with __lt__
+    """
+    def __init__(self, max_states: int = 20000, keep_fraction: float = 0.75):
+        """
+        parameter max_states: the most states that are kept at the same time
+        parameter keep_fraction: fraction of max_states that is kept after an eviction,
+                                 evicting in batches keeps the cost amortized
+        """
+        self.max_states = max_states
+        self.keep = max(1, int(max_states * keep_fraction))
+        self.heap = []
+
+        self.pushed = 0
+        self.pruned = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def empty(self) -> bool:
+        return not self.heap
+
+    def put(self, item):
+        heapq.heappush(self.heap, item)
+        self.pushed += 1
+        if len(self.heap) > self.max_states:
+            self.evict()
+        self.peak = max(self.peak, len(self.heap))
+
+    def get(self):
+        return heapq.heappop(self.heap)
+
+    def evict(self):
+        """
+        Removes the worst states so that self.keep states are left
+        A sorted list is a valid heap so no heapify is needed
+        """
+        self.pruned += len(self.heap) - self.keep
+        self.heap = heapq.nsmallest(self.keep, self.heap)
@@ -0,0 +1,59 @@
+import sc2
+from sc2.constants import *
+from sc2.units import Units
+
+from typing import List, Tuple, Dict, Callable, Hashable
+
+class FrameQueryCache:
+    """
+    Cache of filtered unit collections that lives for one observation
+
+    Managers ask for the same collections (ready pylons, ready townhalls, the
+    assimilators of a base) many times per step. The first call computes it,
+    the others get the same Units object until the game loop changes.
+    Callers must not modify the returned collections
+    """
+    def __init__(self):
+        self.game_loop = -1
+        self.entries: Dict[Hashable, Units] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bot: sc2.BotAI, key: Hashable, compute: Callable[[], Units]) -> Units:
+        """
+        Returns the cached value of key, compute() is only called if it is not cached this frame
+        """
+        if bot.state.game_loop != self.game_loop:
+            self.game_loop = bot.state.game_loop
+            self.entries.clear()
+
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        return value
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def structures(self, bot: sc2.BotAI, unit_id: UnitTypeId) -> Units:
+        return self.get(bot, ("structures", unit_id), lambda: bot.structures(unit_id))
+
+    def ready_structures(self, bot: sc2.BotAI, unit_id: UnitTypeId) -> Units:
+        return self.get(bot, ("ready", unit_id), lambda: self.structures(bot, unit_id).ready)
+
+    def ready_townhalls(self, bot: sc2.BotAI) -> Units:
+        return self.get(bot, "ready_townhalls", lambda: bot.townhalls.ready)
+
+    def ready_gas_buildings(self, bot: sc2.BotAI) -> Units:
+        return self.get(bot, "ready_gas_buildings", lambda: bot.gas_buildings.ready)
+
+    def gas_buildings_near(self, bot: sc2.BotAI, base) -> Units:
+        """
+        Gas buildings of base that still have vespene left
+        """
+        return self.get(bot, ("gas_near", base.tag), lambda: bot.gas_buildings.closer_than(8, base.position)
+                                                              .filter(lambda gas: gas.has_vespene))
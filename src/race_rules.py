@@ -0,0 +1,147 @@
+import sc2
+from sc2 import Race
+from sc2.constants import *
+
+from typing import List, Tuple, Dict
+
+"""
+Per-race rules of the buildorder simulation
+
+Everything where the races differ (who builds structures, where supply comes
+from, larva, addons) is written down once per race in RaceRules and compiled
+into plain dicts. BuildorderState only does lookups in these dicts, so the
+simulation has one code path for all races
+"""
+
+# what happens to the producer when it starts an order
+TRAVEL = "TRAVEL"       # probe: walks to the spot and goes back to mining
+BUSY = "BUSY"           # scv and structures: busy until the order is done
+CONSUMED = "CONSUMED"   # drone and larva: turns into the new unit
+
+# minerals a probe does not mine while walking to the building spot
+TRAVEL_MINERALS = 10
+
+# a hatchery spawns a larva every 11 seconds, at most 3 per hatchery
+LARVA_TICKS = 11 * 22.4
+MAX_LARVA_PER_TOWNHALL = 3
+
+# workers that move from minerals when a gas building finishes, we always fill it
+WORKERS_PER_GAS = 3
+
+class RaceRules:
+    """
+    Rule table of one race
+
+    worker: builds the structures, mines when idle
+    townhalls: produce workers (and larva for zerg), townhalls[0] is the one we build
+    gas_building: moves WORKERS_PER_GAS workers from minerals to vespene when it finishes
+    supply: supply each unit gives when it finishes
+    supply_provider: the unit we build when we need supply
+    builder: TRAVEL, BUSY or CONSUMED, what happens to the worker that builds a structure
+    larva: unit that the townhalls spawn over time, None if the race has none
+    addons: addon -> structures it can be built on
+    extra_requirements: requirements that are not part of the tech requirement dicts
+    morphed_producers: producers we never build, they are morphed from another producer
+    start_units: units that every game starts with
+    """
+    def __init__(self, race: Race, worker: UnitTypeId, townhalls: Tuple[UnitTypeId, ...],
+                 gas_building: UnitTypeId, supply: Dict[UnitTypeId, int], supply_provider: UnitTypeId,
+                 builder: str, larva: UnitTypeId = None,
+                 addons: Dict[UnitTypeId, Tuple[UnitTypeId, ...]] = None,
+                 extra_requirements: Dict[UnitTypeId, UnitTypeId] = None,
+                 morphed_producers: Set[UnitTypeId] = None,
+                 start_units: Set[UnitTypeId] = None):
+        self.race = race
+        self.worker = worker
+        self.townhalls = townhalls
+        self.townhall = townhalls[0]
+        self.gas_building = gas_building
+        self.supply = supply
+        self.supply_provider = supply_provider
+        self.builder = builder
+        self.larva = larva
+        self.addons = addons or {}
+        self.extra_requirements = extra_requirements or {}
+        self.morphed_producers = morphed_producers or set()
+        self.start_units = start_units or set()
+
+        self.compile()
+
+    def compile(self):
+        """
+        Builds the lookup tables that BuildorderState uses
+        """
+        # unit -> (workers added to minerals, workers moved from minerals to vespene) when it finishes
+        self.workers_on_complete: Dict[UnitTypeId, Tuple[int, int]] = {
+            self.worker: (1, 0),
+            self.gas_building: (0, WORKERS_PER_GAS)
+        }
+
+        # producer -> what happens to it when it starts an order, producers not in here are BUSY
+        self.producer_mode: Dict[UnitTypeId, str] = {self.worker: self.builder}
+        if self.larva is not None:
+            self.producer_mode[self.larva] = CONSUMED
+
+        # producer -> mineral workers it takes away while it is busy or after it is consumed
+        self.producer_mining: Dict[UnitTypeId, int] = {}
+        if self.builder != TRAVEL:
+            self.producer_mining[self.worker] = 1
+
+        # structures that spawn larva
+        self.larva_producers: Tuple[UnitTypeId, ...] = self.townhalls if self.larva is not None else ()
+
+        # the townhall gives supply but it is only built for the workers
+        self.supply_per_provider = self.supply[self.supply_provider]
+        self.supply_per_townhall = self.supply.get(self.townhall, 0)
+
+    def __repr__(self):
+        return "RaceRules({})".format(self.race)
+
+
+PROTOSS_RULES = RaceRules(
+    Race.Protoss,
+    worker=PROBE,
+    townhalls=(NEXUS,),
+    gas_building=ASSIMILATOR,
+    supply={PYLON: 8, NEXUS: 15},
+    supply_provider=PYLON,
+    builder=TRAVEL,
+    extra_requirements={GATEWAY: PYLON, WARPGATE: PYLON},
+    morphed_producers={WARPGATE},
+    start_units={PROBE, NEXUS}
+)
+
+TERRAN_RULES = RaceRules(
+    Race.Terran,
+    worker=SCV,
+    townhalls=(COMMANDCENTER,),
+    gas_building=REFINERY,
+    supply={SUPPLYDEPOT: 8, COMMANDCENTER: 15},
+    supply_provider=SUPPLYDEPOT,
+    builder=BUSY,
+    addons={TECHLAB: (BARRACKS, FACTORY, STARPORT), REACTOR: (BARRACKS, FACTORY, STARPORT)},
+    extra_requirements={
+        MARAUDER: TECHLAB, GHOST: TECHLAB,
+        SIEGETANK: TECHLAB, THOR: TECHLAB,
+        RAVEN: TECHLAB, BANSHEE: TECHLAB, BATTLECRUISER: TECHLAB
+    },
+    start_units={SCV, COMMANDCENTER}
+)
+
+ZERG_RULES = RaceRules(
+    Race.Zerg,
+    worker=DRONE,
+    townhalls=(HATCHERY, LAIR, HIVE),
+    gas_building=EXTRACTOR,
+    supply={OVERLORD: 8, HATCHERY: 6},
+    supply_provider=OVERLORD,
+    builder=CONSUMED,
+    larva=LARVA,
+    start_units={DRONE, HATCHERY, OVERLORD, LARVA}
+)
+
+RACE_RULES: Dict[Race, RaceRules] = {
+    Race.Protoss: PROTOSS_RULES,
+    Race.Terran: TERRAN_RULES,
+    Race.Zerg: ZERG_RULES
+}
@@ -0,0 +1,139 @@
+import argparse
+import json
+import time
+from multiprocessing import Pool
+
+import sc2
+from sc2 import Race, Difficulty
+from sc2.constants import *
+from sc2.player import Bot, Computer
+
+from typing import List, Tuple, Dict
+
+from ubot import UBot
+
+"""
+Runs many non-realtime games in parallel and reports the performance of UBot
+
+Usage: python runner.py --games 8 --workers 4 --maps CatalystLE AcropolisLE
+"""
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Returns the p:th percentile (0-100) of values, nearest-rank
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+def create_opponent(opponent: str, race: Race, difficulty: Difficulty):
+    """
+    opponent is either "computer" (the built-in AI) or "ubot" (a local copy of UBot)
+    """
+    if opponent == "ubot":
+        return Bot(race, UBot())
+    return Computer(race, difficulty)
+
+def run_one(job: Dict) -> Dict:
+    """
+    Runs one game in this process and returns its statistics
+    """
+    bot = UBot()
+    opponent = create_opponent(job["opponent"], Race[job["race"]], Difficulty[job["difficulty"]])
+
+    start = time.perf_counter()
+    result = sc2.run_game(
+        sc2.maps.get(job["map"]),
+        [Bot(Race.Protoss, bot), opponent],
+        realtime=False,
+    )
+    wall_time = time.perf_counter() - start
+
+    latencies = bot.step_controller.latencies
+    game_minutes = bot.time / 60 if bot.time > 0 else 0
+    return {
+        "game": job["game"],
+        "map": job["map"],
+        "result": str(result),
+        "wall_time": wall_time,
+        "game_time": bot.time,
+        "steps": len(latencies),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+        "planner_time": bot.m_build.planner_time,
+        "actions": bot.actions_issued,
+        "raw_actions": bot.raw_actions_sent,
+        "apm": bot.actions_issued / game_minutes if game_minutes > 0 else 0.0,
+    }
+
+def aggregate(games: List[Dict]) -> Dict:
+    """
+    Combines the statistics of all games into one report
+    """
+    results = {}
+    for game in games:
+        results[game["result"]] = results.get(game["result"], 0) + 1
+
+    def values(key):
+        return [game[key] for game in games]
+
+    return {
+        "games": len(games),
+        "results": results,
+        "latency_p50": percentile(values("latency_p50"), 50),
+        "latency_p95": percentile(values("latency_p95"), 50),
+        "latency_p99_worst": max(values("latency_p99"), default=0.0),
+        "latency_max": max(values("latency_max"), default=0.0),
+        "planner_time_mean": sum(values("planner_time")) / len(games) if games else 0.0,
+        "apm_mean": sum(values("apm")) / len(games) if games else 0.0,
+        "per_game": games,
+    }
+
+def print_report(report: Dict):
+    print("Games: {}, results: {}".format(report["games"], report["results"]))
+    print("Step latency (ms, median over games): p50 {:.2f}, p95 {:.2f}, worst p99 {:.2f}, max {:.2f}".format(
+        report["latency_p50"]*1000, report["latency_p95"]*1000,
+        report["latency_p99_worst"]*1000, report["latency_max"]*1000))
+    print("Planner time (s): {:.3f} mean, APM: {:.1f} mean".format(
+        report["planner_time_mean"], report["apm_mean"]))
+    for game in report["per_game"]:
+        print(" game {} on {}: {}, {} steps, p95 {:.2f} ms, planner {:.3f} s, apm {:.1f}".format(
+            game["game"], game["map"], game["result"], game["steps"],
+            game["latency_p95"]*1000, game["planner_time"], game["apm"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run parallel headless games with UBot")
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--maps", nargs="+", default=["CatalystLE"])
+    parser.add_argument("--opponent", choices=["computer", "ubot"], default="computer")
+    parser.add_argument("--race", default="Protoss")
+    parser.add_argument("--difficulty", default="Easy")
+    parser.add_argument("--output", default=None, help="write the report as json to this file")
+    args = parser.parse_args()
+
+    jobs = [{
+        "game": i,
+        "map": args.maps[i % len(args.maps)],
+        "opponent": args.opponent,
+        "race": args.race,
+        "difficulty": args.difficulty,
+    } for i in range(args.games)]
+
+    # every game gets its own process so that the games do not share an event loop
+    with Pool(processes=args.workers, maxtasksperchild=1) as pool:
+        games = pool.map(run_one, jobs)
+
+    report = aggregate(games)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import math
+
+import sc2
+
+from typing import List, Tuple, Dict
+
+GAME_LOOPS_PER_SECOND = 22.4
+
+class StepController:
+    """
+    Adaptive game_step driven by the measured on_step wall time
+
+    During combat we want fine stepping (min_step) and during quiet macro phases
+    we can coarsen to max_step. If the steps get too expensive for the current
+    game_step we step coarser, so that we do not miss frames under CPU load
+    """
+    def __init__(self, min_step: int = 2, max_step: int = 8, budget: float = 0.8, smoothing: float = 0.2):
+        """
+        parameter min_step, max_step: bounds of game_step
+        parameter budget: fraction of the frames of a step that on_step may use
+        parameter smoothing: weight of the newest measurement in the moving average
+        """
+        self.min_step = min_step
+        self.max_step = max_step
+        self.budget = budget
+        self.smoothing = smoothing
+
+        self.game_step = max_step
+        self.avg_latency = 0.0
+        # every measured latency, used for the reports of runner.py
+        self.latencies: List[float] = []
+
+    def latency_floor(self) -> int:
+        """
+        Returns the smallest game_step where the average on_step latency fits in the budget
+        """
+        return math.ceil(self.avg_latency * GAME_LOOPS_PER_SECOND / self.budget)
+
+    def update(self, bot: sc2.BotAI, latency: float, in_combat: bool) -> int:
+        """
+        Records the latency (seconds) of the last on_step and sets bot._client.game_step
+        Returns the new game_step
+        """
+        self.latencies.append(latency)
+        if self.avg_latency == 0:
+            self.avg_latency = latency
+        else:
+            self.avg_latency += self.smoothing * (latency - self.avg_latency)
+
+        wanted = self.min_step if in_combat else self.max_step
+        game_step = min(self.max_step, max(self.min_step, wanted, self.latency_floor()))
+
+        if game_step != self.game_step:
+            self.game_step = game_step
+            bot._client.game_step = game_step
+        return game_step
@@ -0,0 +1,238 @@
+import math
+
+import numpy as np
+
+import sc2
+from sc2 import Race
+from sc2.constants import *
+
+from typing import List, Tuple, Dict
+
+from sc2.dicts.unit_trained_from import UNIT_TRAINED_FROM
+
+from help_dicts import PROTOSS_ALL_UNITS, TERRAN_ALL_UNITS, ZERG_ALL_UNITS
+from help_dicts import UnitIndex, PROTOSS_INDEX, TERRAN_INDEX, ZERG_INDEX
+from race_rules import RaceRules, RACE_RULES
+
+"""
+Tech-tree DAG that is compiled once per race
+
+Walking PROTOSS_TECH_REQUIREMENT and UNIT_TRAINED_FROM for every query is slow,
+instead everything is walked once and stored as tuples and sets
+"""
+
+RACE_UNITS: Dict[Race, Set[UnitTypeId]] = {
+    Race.Protoss: PROTOSS_ALL_UNITS,
+    Race.Terran: TERRAN_ALL_UNITS,
+    Race.Zerg: ZERG_ALL_UNITS
+}
+
+RACE_INDEX: Dict[Race, UnitIndex] = {
+    Race.Protoss: PROTOSS_INDEX,
+    Race.Terran: TERRAN_INDEX,
+    Race.Zerg: ZERG_INDEX
+}
+
+RACE_TECH_REQUIREMENT: Dict[Race, Dict[UnitTypeId, UnitTypeId]] = {
+    Race.Protoss: PROTOSS_TECH_REQUIREMENT,
+    Race.Terran: TERRAN_TECH_REQUIREMENT,
+    Race.Zerg: ZERG_TECH_REQUIREMENT
+}
+
+class TechTree:
+    """
+    Precomputed tech-tree for one race
+
+    requirements: every unit that must exist before the unit can be built,
+                  closest requirement first
+    producers: every unit that can build the unit
+    planned_producers: the producer that the planner builds for the unit, the one with the fewest
+                       requirements, empty if it is morphed or larva
+    build_chain: the unit followed by everything that has to be built for it, its requirements
+                 and the planned producers with their own chains, used when deriving orders
+    cost: (minerals, vespene, build time) of the unit, supply_cost its supply
+    critical_path: least number of ticks to build the unit from the start units, see ticks_until_exists
+    tech_buildings: structures that only unlock tech, we never need more than one,
+                    supply providers are not part of them
+
+    requirement_mask and producer_mask hold the same sets as bitmasks over self.index,
+    the *_array members hold costs, critical paths and build chains as numpy columns over self.index
+    """
+    def __init__(self, race: Race, bot: sc2.BotAI):
+        self.race = race
+        self.rules: RaceRules = RACE_RULES[race]
+        self.units: Set[UnitTypeId] = RACE_UNITS[race]
+        self.index: UnitIndex = RACE_INDEX[race]
+        self.tech_requirement: Dict[UnitTypeId, UnitTypeId] = RACE_TECH_REQUIREMENT[race]
+
+        self.requirements: Dict[UnitTypeId, Tuple[UnitTypeId, ...]] = {}
+        self.producers: Dict[UnitTypeId, Tuple[UnitTypeId, ...]] = {}
+        self.planned_producers: Dict[UnitTypeId, Tuple[UnitTypeId, ...]] = {}
+        self.build_chain: Dict[UnitTypeId, Tuple[UnitTypeId, ...]] = {}
+        self.cost: Dict[UnitTypeId, Tuple[int, int, float]] = {}
+        self.supply_cost: Dict[UnitTypeId, float] = {}
+        self.build_time: Dict[UnitTypeId, float] = {}
+        self.requires_vespene: Dict[UnitTypeId, bool] = {}
+        self.critical_path: Dict[UnitTypeId, float] = {}
+
+        for unit in self.units:
+            self.requirements[unit] = self._walk_requirements(unit)
+            # producers outside of the race set (e.g. PLANETARYFORTRESS) are never planned, larva is spawned
+            producers = UNIT_TRAINED_FROM.get(unit, ()) or self.rules.addons.get(unit, ())
+            self.producers[unit] = tuple(producer for producer in producers
+                                            if producer in self.units or producer == self.rules.larva)
+
+        for unit in self.units:
+            # one producer is enough (BARRACKS for TECHLAB, not also FACTORY and STARPORT),
+            # morphed producers and larva come by themselves
+            candidates = [producer for producer in self.producers[unit]
+                            if not producer in self.rules.morphed_producers and producer != self.rules.larva]
+            self.planned_producers[unit] = tuple(sorted(candidates, key=lambda producer: len(self.requirements[producer]))[:1])
+
+        for unit in self.units:
+            self.build_chain[unit] = (unit,) + self._walk_build_chain(unit)
+
+        costs_vespene = set()
+        for unit in self.units:
+            cost = bot.calculate_cost(unit)
+            self.cost[unit] = (cost.minerals, cost.vespene, cost.time)
+            self.supply_cost[unit] = bot.calculate_supply_cost(unit)
+            self.build_time[unit] = cost.time
+            if cost.vespene > 0:
+                costs_vespene.add(unit)
+
+        start = {unit: 0 for unit in self.rules.start_units}
+        for unit in self.units:
+            self.requires_vespene[unit] = any(req in costs_vespene for req in self.build_chain[unit])
+            self.critical_path[unit] = self.ticks_until_exists(unit, start, self.critical_path)
+
+        all_producers = {producer for unit in self.units for producer in self.producers[unit]}
+        # supply providers (e.g. SUPPLYDEPOT for BARRACKS) are requirements too, but we need many
+        self.tech_buildings: Set[UnitTypeId] = {
+            req for req in self.tech_requirement.values()
+            if not req in all_producers and not req in self.rules.supply and req in self.units
+        }
+
+        self.requirement_mask: Dict[UnitTypeId, int] = {
+            unit: self.index.mask(self.requirements[unit]) for unit in self.units
+        }
+        self.producer_mask: Dict[UnitTypeId, int] = {
+            unit: self.index.mask(self.producers[unit]) for unit in self.units
+        }
+
+        # column i is self.index.ids[i]
+        self.cost_array = np.array([self.cost.get(unit, (0, 0, 0)) for unit in self.index.ids], dtype=np.float64)
+        self.supply_array = np.array([self.supply_cost.get(unit, 0) for unit in self.index.ids], dtype=np.float64)
+        self.critical_path_array = np.array([self.critical_path.get(unit, 0) for unit in self.index.ids], dtype=np.float64)
+        # build_chain_array[i, j] is True if unit j is in the build chain of unit i
+        self.build_chain_array = np.zeros((self.index.size, self.index.size), dtype=bool)
+        for unit in self.units:
+            for needed in self.build_chain[unit][1:]:
+                if needed in self.index:
+                    self.build_chain_array[self.index.index(unit), self.index.index(needed)] = True
+
+    def is_requirement(self, req: UnitTypeId, unit: UnitTypeId) -> bool:
+        """
+        Returns True if req (transitively) has to exist before unit can be built
+        """
+        return self.index.in_mask(self.requirement_mask.get(unit, 0), req)
+
+    def is_producer(self, producer: UnitTypeId, unit: UnitTypeId) -> bool:
+        return self.index.in_mask(self.producer_mask.get(unit, 0), producer)
+
+    def is_independent(self, a: UnitTypeId, b: UnitTypeId) -> bool:
+        """
+        Returns True if building a then b ends in the same state as b then a,
+        not counting supply which depends on the state
+        They are not independent if one is needed for the other, if they compete
+        for the same producer or if one is a gas building
+        Workers that build structures are not blocked by it, so they do not count
+        """
+        gas_building = self.rules.gas_building
+        if a == b or a == gas_building or b == gas_building:
+            return False
+        worker = self.rules.worker
+        for x, y in ((a, b), (b, a)):
+            if self.is_requirement(x, y):
+                return False
+            if self.is_producer(x, y) and x != worker:
+                return False
+        shared = set(self.producers.get(a, ())) & set(self.producers.get(b, ()))
+        shared.discard(worker)
+        return not shared
+
+    def _walk_requirements(self, unit: UnitTypeId) -> Tuple[UnitTypeId, ...]:
+        """
+        Returns the transitive closure of the requirements of unit
+        """
+        reqs = []
+        stack = [unit]
+        while stack:
+            cur = stack.pop()
+            direct = []
+            if cur in self.tech_requirement:
+                direct.append(self.tech_requirement[cur])
+            if cur in self.rules.extra_requirements:
+                direct.append(self.rules.extra_requirements[cur])
+            for req in direct:
+                if not req in reqs:
+                    reqs.append(req)
+                    stack.append(req)
+        return tuple(reqs)
+
+    def _walk_build_chain(self, unit: UnitTypeId) -> Tuple[UnitTypeId, ...]:
+        """
+        Returns the requirements and planned producers of unit, and theirs, transitively
+        The start units are left out, every game has them
+        """
+        chain = []
+        stack = [unit]
+        while stack:
+            cur = stack.pop()
+            for needed in self.requirements.get(cur, ()) + self.planned_producers.get(cur, ()):
+                if needed == unit or needed in chain or needed in self.rules.start_units:
+                    continue
+                chain.append(needed)
+                stack.append(needed)
+        return tuple(chain)
+
+    def ticks_until_exists(self, unit: UnitTypeId, ready: Dict[UnitTypeId, float],
+                           memo: Dict[UnitTypeId, float]) -> float:
+        """
+        Least number of ticks until unit exists, counting only build times:
+        its requirements and its fastest producer are made first, resources are not counted
+        ready holds the units that exist (0) or are being built (ticks left),
+        memo is filled with the results and can be reused for the same ready
+        """
+        if unit in ready:
+            return ready[unit]
+        if unit in memo:
+            return memo[unit]
+        if unit == self.rules.larva:
+            # larva is spawned by the townhalls
+            return min(self.ticks_until_exists(townhall, ready, memo) for townhall in self.rules.larva_producers)
+        if not unit in self.units:
+            return math.inf
+        # cuts cycles such as NEXUS -> PROBE -> NEXUS
+        memo[unit] = math.inf
+
+        req_ticks = max((self.ticks_until_exists(req, ready, memo) for req in self.requirements[unit]), default=0)
+        producer_ticks = min((self.ticks_until_exists(producer, ready, memo)
+                                for producer in self.producers[unit]
+                                if not producer in self.rules.morphed_producers), default=0)
+        memo[unit] = self.build_time[unit] + max(req_ticks, producer_ticks)
+        return memo[unit]
+
+
+_TECH_TREES: Dict[Race, TechTree] = {}
+
+def get_tech_tree(bot: sc2.BotAI, race: Race = None) -> TechTree:
+    """
+    Returns the compiled TechTree for race (default is the race of bot)
+    It is compiled on the first call and reused after that
+    """
+    if race is None:
+        race = bot.race
+    if not race in _TECH_TREES:
+        _TECH_TREES[race] = TechTree(race, bot)
+    return _TECH_TREES[race]
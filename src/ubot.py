@@ -1,23 +1,45 @@
 import random
+import time
 
 import sc2
 from sc2 import Race, Difficulty
 from sc2.constants import *
 from sc2.player import Bot, Computer
+from sc2.action import combine_actions
 
 from base_manager import BaseManager
 import manager_build
 import manager_resources
 import manager_army
+from step_controller import StepController
+from distance_field import DistanceFields
+from tech_tree import get_tech_tree
+from query_cache import FrameQueryCache
+from logger import setup_logging, get_logger
+
+logger = get_logger("bot")
 
 class UBot(sc2.BotAI):
     def __init__(self):
         # Initialize inherited class
         sc2.BotAI.__init__(self)
+        setup_logging()
         
         # apperantly we are running 8 frames per on_step
-        # this should be settable through some sort of
-        # self._client.game_step = 
+        # the StepController sets self._client.game_step from the measured step time
+        self.step_controller = StepController()
+        # number of unit commands issued through self.do, used to calculate actions per minute
+        self.actions_issued = 0
+        # number of them that python-sc2 sends, without the orders the units already have
+        self.actions_kept = 0
+        # number of raw actions python-sc2 sends for them, after combine_actions merged them
+        self.raw_actions_sent = 0
+
+        # filtered unit collections shared by the managers, cleared every game loop
+        self.queries = FrameQueryCache()
+
+        # ground distance fields from key locations, created in on_start
+        self.distance_fields: DistanceFields = None
 
         self.managers: List[BaseManager] = []
         self.gas_focus = True
@@ -30,10 +52,40 @@ class UBot(sc2.BotAI):
         self.managers.append(self.m_resources)
         self.managers.append(self.m_army)
         
+    async def on_start(self):
+        """
+        Warmup before the first step, everything that only depends on the map
+        and the tech-tree is computed here instead of on the game loop
+        """
+        start = time.perf_counter()
+
+        # cost and tech tables that the buildorder search uses
+        get_tech_tree(self)
+
+        self.distance_fields = DistanceFields(self)
+        # every place where we can have a nexus, fields are never computed during a step
+        key_locations = [self.main_base_ramp.protoss_wall_warpin, self.enemy_start_locations[0]]
+        key_locations.extend(th.position for th in self.townhalls)
+        key_locations.extend(self.expansion_locations.keys())
+        self.distance_fields.precompute(key_locations)
+
+        # base indices, influence map and the opening plan
+        for manager in self.managers:
+            await manager.on_start(self)
+
+        logger.info("Warmup took %.3f seconds", time.perf_counter() - start)
+
     async def on_step(self, iteration):
-        print("Current iteration: " + str(iteration))
+        logger.debug("Current iteration: %d", iteration)
+        start = time.perf_counter()
         for manager in self.managers:
             await manager.on_step(self, iteration)
+        self.step_controller.update(self, time.perf_counter() - start, self.m_army.in_combat)
+        # the same filter and merge that python-sc2 applies when it sends self.actions
+        kept = [action for action in self.actions if self.prevent_double_actions(action)]
+        self.actions_issued += len(self.actions)
+        self.actions_kept += len(kept)
+        self.raw_actions_sent += sum(1 for _ in combine_actions(kept))
 
 
     async def on_building_construction_complete(self, unit):
@@ -48,3 +100,11 @@ class UBot(sc2.BotAI):
         for manager in self.managers:
             await manager.on_unit_destroyed(self, unit_tag)
         pass
+
+    async def on_end(self, game_result):
+        logger.info("Query cache: %d hits, %d misses (%.0f%% hit rate)",
+                    self.queries.hits, self.queries.misses, 100 * self.queries.hit_rate())
+        grouper = self.m_army.grouper
+        logger.info("Army commands: %d in %d groups", grouper.total_commands, grouper.total_groups)
+        logger.info("Unit commands: %d, %d without the orders units already had, sent as %d raw actions",
+                    self.actions_issued, self.actions_kept, self.raw_actions_sent)
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sc2 import Race
+from sc2.constants import *
+
+"""
+A bot that only knows costs and supply, enough for the tech tree,
+the buildorder state and the search to run without a game
+"""
+
+COSTS = {
+    PROBE: (50, 0, 272), PYLON: (100, 0, 400), NEXUS: (400, 0, 1600),
+    GATEWAY: (150, 0, 1040), WARPGATE: (0, 0, 160), ZEALOT: (100, 0, 608),
+    ASSIMILATOR: (75, 0, 480), CYBERNETICSCORE: (150, 0, 800), STALKER: (125, 50, 688),
+    SCV: (50, 0, 272), SUPPLYDEPOT: (100, 0, 480), COMMANDCENTER: (400, 0, 1600),
+    BARRACKS: (150, 0, 1040), MARINE: (50, 0, 400), REFINERY: (75, 0, 480),
+    TECHLAB: (50, 25, 400), MARAUDER: (100, 25, 480),
+    DRONE: (50, 0, 272), OVERLORD: (100, 0, 400), HATCHERY: (300, 0, 1600),
+    SPAWNINGPOOL: (200, 0, 1040), ZERGLING: (50, 0, 384), EXTRACTOR: (25, 0, 480),
+    QUEEN: (150, 0, 800), ROACHWARREN: (150, 0, 880), ROACH: (75, 25, 432)
+}
+SUPPLY = {
+    PROBE: 1.0, ZEALOT: 2.0, STALKER: 2.0,
+    SCV: 1.0, MARINE: 1.0, MARAUDER: 2.0,
+    DRONE: 1.0, ZERGLING: 1.0, QUEEN: 2.0, ROACH: 2.0
+}
+
+class Cost:
+    def __init__(self, minerals, vespene, time):
+        self.minerals = minerals
+        self.vespene = vespene
+        self.time = time
+
+class FakeBot:
+    def __init__(self, race: Race = Race.Protoss):
+        self.race = race
+
+    def calculate_cost(self, unit_id):
+        return Cost(*COSTS.get(unit_id, (100, 100, 1000)))
+
+    def calculate_supply_cost(self, unit_id):
+        return SUPPLY.get(unit_id, 0)
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("sc2")
+
+from sc2 import Race
+from sc2.constants import *
+
+from fake_bot import FakeBot
+from buildorder_state import BuildorderState
+from manager_build import ManagerBuild
+
+def search(goal, minerals, units, use_order_reduction, use_macro_actions):
+    """
+    Returns (makespan, expansions) of the best plan from a state with minerals and units
+    """
+    manager = ManagerBuild()
+    manager.use_order_reduction = use_order_reduction
+    manager.use_macro_actions = use_macro_actions
+    manager.get_buildorder_state = lambda bot: BuildorderState(minerals, 0, 12, 0, 12, 23, dict(units), [], [], bot)
+    plan = manager.calculate_buildorder(goal, FakeBot())
+    assert plan
+    return manager.last_plan_ticks, manager.last_expansions
+
+GOALS = [
+    {PROBE: 14, PYLON: 2, GATEWAY: 1},
+    {PROBE: 15, PYLON: 2, GATEWAY: 2}
+]
+
+@pytest.mark.parametrize("goal", GOALS)
+@pytest.mark.parametrize("use_macro_actions", [False, True])
+def test_order_reduction_keeps_makespan(goal, use_macro_actions):
+    # with banked minerals many orders can start right away, those are the interleavings that are skipped
+    units = {NEXUS: 1, PROBE: 12, PYLON: 1}
+    full_ticks, full_expansions = search(goal, 400, units, False, use_macro_actions)
+    reduced_ticks, reduced_expansions = search(goal, 400, units, True, use_macro_actions)
+
+    assert reduced_ticks == full_ticks
+    assert reduced_expansions < full_expansions
+
+@pytest.mark.parametrize("use_macro_actions", [False, True])
+def test_order_reduction_keeps_makespan_when_orders_wait(use_macro_actions):
+    # orders that wait for minerals start at different ticks in each interleaving, none are skipped
+    goal = {PROBE: 13, GATEWAY: 1}
+    units = {NEXUS: 1, PROBE: 12}
+    full_ticks, _ = search(goal, 50, units, False, use_macro_actions)
+    reduced_ticks, _ = search(goal, 50, units, True, use_macro_actions)
+
+    assert reduced_ticks == full_ticks
+
+START_UNITS = {
+    Race.Protoss: ({NEXUS: 1, PROBE: 12}, 15),
+    Race.Terran: ({COMMANDCENTER: 1, SCV: 12}, 15),
+    Race.Zerg: ({HATCHERY: 1, DRONE: 12, OVERLORD: 1, LARVA: 3}, 14)
+}
+
+ESTIMATE_GOALS = [
+    (Race.Protoss, {PROBE: 16, STALKER: 2}),
+    (Race.Protoss, {ZEALOT: 6}),
+    (Race.Protoss, {IMMORTAL: 1}),
+    (Race.Terran, {SCV: 16, MARINE: 4}),
+    (Race.Terran, {SCV: 14, MARAUDER: 1}),
+    (Race.Zerg, {DRONE: 16, ZERGLING: 6}),
+    (Race.Zerg, {ROACH: 2})
+]
+
+@pytest.mark.parametrize("race, goal", ESTIMATE_GOALS)
+def test_estimate_bounds_search(race, goal):
+    units, supply_cap = START_UNITS[race]
+    start = lambda bot: BuildorderState(50, 0, 12, 0, 12, supply_cap, dict(units), [], [], bot)
+    bot = FakeBot(race)
+    manager = ManagerBuild()
+    manager.get_buildorder_state = start
+
+    (lower, upper), = manager.estimate_goals([goal], start(bot))
+    plan = manager.calculate_buildorder(goal, bot)
+    assert plan
+    assert lower <= manager.last_plan_done <= upper
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("sc2")
+
+from sc2 import Race
+from sc2.constants import *
+
+from fake_bot import FakeBot
+from buildorder_state import BuildorderState
+
+def zerg_state(bot, units, busy_units=(), larva_progress=0.0):
+    state = BuildorderState(1000, 0, 12, 0, 12, 14, dict(units), list(busy_units), [], bot)
+    state.larva_progress = larva_progress
+    return state
+
+def test_build_waits_for_larva():
+    bot = FakeBot(Race.Zerg)
+    state = zerg_state(bot, {HATCHERY: 1, SPAWNINGPOOL: 1, DRONE: 12, LARVA: 0}, larva_progress=0.237)
+
+    ticks = state.when(ZERGLING)
+    assert ticks > 0
+    state.sim(ticks, bot)
+
+    # the larva spawns exactly at ticks, not one rounding error later
+    assert state.units[LARVA] == 1
+    assert state.build(ZERGLING, bot)
+    assert state.units[LARVA] == 0
+    assert state.get_number_of_unit(ZERGLING) == 1
+
+def test_build_without_producer_fails():
+    bot = FakeBot(Race.Zerg)
+    state = zerg_state(bot, {HATCHERY: 1, SPAWNINGPOOL: 1, DRONE: 12, LARVA: 0})
+
+    minerals, supply = state.minerals, state.supply
+    assert not state.build(ZERGLING, bot)
+    assert state.minerals == minerals and state.supply == supply
+    assert state.get_number_of_unit(ZERGLING) == 0
+    assert state.plan == []
+
+def test_busy_townhall_spawns_larva():
+    bot = FakeBot(Race.Zerg)
+    # the hatchery trains a queen, it is busy but keeps spawning larva
+    state = zerg_state(bot, {SPAWNINGPOOL: 1, DRONE: 12, LARVA: 0}, busy_units=[(HATCHERY, 800, False)])
+
+    ticks = state.when(ZERGLING)
+    assert 0 < ticks < 800
+    state.sim(ticks, bot)
+    assert state.units[LARVA] == 1